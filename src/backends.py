@@ -0,0 +1,286 @@
+import inspect
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import torch
+import whisper
+from torch import nn
+from whisper.audio import N_FRAMES
+from whisper.decoding import Inference, PyTorchInference
+
+from .config import Config
+
+ONNX_OPSET = 17
+ONNX_EXPORT_VERSION = 1
+
+
+class TranscriptionBackend:
+    """Interface dos backends: carrega o modelo e fornece a inferência do decoder"""
+
+    name = None
+    # Se True, o model.decode precisa ser substituído para usar create_inference
+    replaces_decoder = False
+
+    def select_device(self):
+        return "cuda" if torch.cuda.is_available() else "cpu"
+
+    def load_model(self, model_name, device):
+        raise NotImplementedError
+
+    def create_inference(self, model, initial_token_length):
+        return PyTorchInference(model, initial_token_length)
+
+
+class PyTorchBackend(TranscriptionBackend):
+    """Caminho padrão: whisper.load_model e inferência em PyTorch"""
+
+    name = "pytorch"
+
+    def load_model(self, model_name, device):
+        return whisper.load_model(model_name, device=device)
+
+
+def _attention(attention, q, k, v, mask=None):
+    """Atenção multi-cabeça do Whisper sem SDPA (máscara com deslocamento do cache)"""
+    scale = (q.shape[-1] // attention.n_head) ** -0.25
+    q = q.view(*q.shape[:2], attention.n_head, -1).permute(0, 2, 1, 3) * scale
+    k = k.view(*k.shape[:2], attention.n_head, -1).permute(0, 2, 3, 1) * scale
+    v = v.view(*v.shape[:2], attention.n_head, -1).permute(0, 2, 1, 3)
+
+    qk = q @ k
+    if mask is not None:
+        qk = qk + mask
+    weights = qk.float().softmax(dim=-1).to(q.dtype)
+    return attention.out((weights @ v).permute(0, 2, 1, 3).flatten(start_dim=2))
+
+
+class _CrossAttentionProjections(nn.Module):
+    """Chaves e valores da atenção cruzada de todas as camadas, calculados uma vez por janela"""
+
+    def __init__(self, decoder):
+        super().__init__()
+        self.decoder = decoder
+
+    def forward(self, audio_features):
+        keys = [block.cross_attn.key(audio_features) for block in self.decoder.blocks]
+        values = [block.cross_attn.value(audio_features) for block in self.decoder.blocks]
+        return torch.stack(keys), torch.stack(values)
+
+
+class _DecoderStep(nn.Module):
+    """Decoder de texto com o cache de autoatenção explícito (entrada e saída do grafo)"""
+
+    def __init__(self, decoder):
+        super().__init__()
+        self.decoder = decoder
+
+    def forward(self, tokens, cross_keys, cross_values, self_keys, self_values):
+        decoder = self.decoder
+        offset = self_keys.shape[2]
+        positions = torch.arange(tokens.shape[-1], device=tokens.device) + offset
+        x = decoder.token_embedding(tokens) + decoder.positional_embedding[positions]
+
+        key_positions = torch.arange(offset + tokens.shape[-1], device=tokens.device)
+        mask = torch.where(
+            key_positions[None, :] > positions[:, None],
+            torch.tensor(-np.inf, dtype=x.dtype),
+            torch.tensor(0.0, dtype=x.dtype),
+        )
+
+        present_keys, present_values = [], []
+        for i, block in enumerate(decoder.blocks):
+            attn_input = block.attn_ln(x)
+            keys = torch.cat([self_keys[i], block.attn.key(attn_input)], dim=1)
+            values = torch.cat([self_values[i], block.attn.value(attn_input)], dim=1)
+            present_keys.append(keys)
+            present_values.append(values)
+
+            x = x + _attention(block.attn, block.attn.query(attn_input), keys, values, mask)
+            cross_input = block.cross_attn_ln(x)
+            x = x + _attention(block.cross_attn, block.cross_attn.query(cross_input), cross_keys[i], cross_values[i])
+            x = x + block.mlp(block.mlp_ln(x))
+
+        x = decoder.ln(x)
+        logits = (x @ decoder.token_embedding.weight.t()).float()
+        return logits, torch.stack(present_keys), torch.stack(present_values)
+
+
+def _export_graph(module, args, path, input_names, output_names, dynamic_axes):
+    kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        # O exportador baseado em TorchScript lida com o laço de blocos sem reescrever o modelo
+        kwargs["dynamo"] = False
+
+    torch.onnx.export(
+        module, args, str(path),
+        input_names=input_names,
+        output_names=output_names,
+        dynamic_axes=dynamic_axes,
+        opset_version=ONNX_OPSET,
+        **kwargs,
+    )
+
+
+def export_onnx(model, export_dir):
+    """Exporta encoder, projeções da atenção cruzada e decoder com cache para export_dir"""
+    export_dir = Path(export_dir)
+    tmp_dir = export_dir.with_name(f".{export_dir.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    dims = model.dims
+    layer_axes = {1: "batch", 2: "length"}
+
+    try:
+        with torch.no_grad():
+            mel = torch.zeros(1, dims.n_mels, N_FRAMES)
+            audio_features = model.encoder(mel)
+            _export_graph(
+                model.encoder, (mel,), tmp_dir / "encoder.onnx",
+                ["mel"], ["audio_features"],
+                {"mel": {0: "batch"}, "audio_features": {0: "batch"}},
+            )
+
+            cross = _CrossAttentionProjections(model.decoder)
+            cross_keys, cross_values = cross(audio_features)
+            _export_graph(
+                cross, (audio_features,), tmp_dir / "cross_attention.onnx",
+                ["audio_features"], ["cross_keys", "cross_values"],
+                {"audio_features": {0: "batch"}, "cross_keys": {1: "batch"}, "cross_values": {1: "batch"}},
+            )
+
+            tokens = torch.zeros(1, 3, dtype=torch.long)
+            past = torch.zeros(dims.n_text_layer, 1, 1, dims.n_text_state)
+            _export_graph(
+                _DecoderStep(model.decoder), (tokens, cross_keys, cross_values, past, past),
+                tmp_dir / "decoder.onnx",
+                ["tokens", "cross_keys", "cross_values", "self_keys", "self_values"],
+                ["logits", "present_keys", "present_values"],
+                {
+                    "tokens": {0: "batch", 1: "tokens"},
+                    "cross_keys": {1: "batch"},
+                    "cross_values": {1: "batch"},
+                    "self_keys": layer_axes,
+                    "self_values": layer_axes,
+                    "logits": {0: "batch", 1: "tokens"},
+                    "present_keys": layer_axes,
+                    "present_values": layer_axes,
+                },
+            )
+
+        try:
+            os.rename(tmp_dir, export_dir)
+        except OSError:
+            # Outro processo terminou a mesma exportação primeiro
+            if not export_dir.exists():
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return export_dir
+
+
+class OnnxEncoder(nn.Module):
+    """Substitui o AudioEncoder do Whisper por uma sessão do ONNX Runtime"""
+
+    def __init__(self, session):
+        super().__init__()
+        self.session = session
+
+    def forward(self, x):
+        (audio_features,) = self.session.run(None, {"mel": x.float().cpu().numpy()})
+        return torch.from_numpy(audio_features)
+
+
+class OnnxInference(Inference):
+    """Decoder no ONNX Runtime com os caches de atenção mantidos em arrays NumPy"""
+
+    def __init__(self, cross_session, decoder_session, dims):
+        self.cross_session = cross_session
+        self.decoder_session = decoder_session
+        self.dims = dims
+        self.cleanup_caching()
+
+    def logits(self, tokens, audio_features):
+        if self.cross_keys is None:
+            self.cross_keys, self.cross_values = self.cross_session.run(
+                None, {"audio_features": audio_features.float().numpy()}
+            )
+            empty = np.zeros((self.dims.n_text_layer, tokens.shape[0], 0, self.dims.n_text_state), np.float32)
+            self.self_keys = self.self_values = empty
+
+        n_cached = self.self_keys.shape[2]
+        logits, self.self_keys, self.self_values = self.decoder_session.run(None, {
+            "tokens": tokens[:, n_cached:].numpy(),
+            "cross_keys": self.cross_keys,
+            "cross_values": self.cross_values,
+            "self_keys": self.self_keys,
+            "self_values": self.self_values,
+        })
+        return torch.from_numpy(logits)
+
+    def rearrange_kv_cache(self, source_indices):
+        if source_indices != list(range(len(source_indices))):
+            self.self_keys = self.self_keys[:, source_indices]
+            self.self_values = self.self_values[:, source_indices]
+
+    def cleanup_caching(self):
+        self.cross_keys = self.cross_values = None
+        self.self_keys = self.self_values = None
+
+
+class OnnxBackend(TranscriptionBackend):
+    """Encoder e decoder no ONNX Runtime (CPU), exportados uma vez e reaproveitados do disco.
+
+    O decoder PyTorch continua carregado apenas para o alinhamento de palavras.
+    """
+
+    name = "onnx"
+    replaces_decoder = True
+    GRAPHS = ["encoder", "cross_attention", "decoder"]
+
+    def __init__(self, models_dir=None):
+        self.models_dir = Path(models_dir or Config.ONNX_MODELS_DIR)
+        self.sessions = {}
+
+    def select_device(self):
+        return "cpu"
+
+    def load_model(self, model_name, device):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise RuntimeError("O backend 'onnx' requer o pacote onnxruntime (pip install onnxruntime onnx)") from e
+
+        model = whisper.load_model(model_name, device="cpu")
+
+        export_dir = self.models_dir / f"{model_name}-v{ONNX_EXPORT_VERSION}"
+        if not export_dir.exists():
+            print(f"📦 Exportando '{model_name}' para ONNX (apenas na primeira vez)...")
+            export_onnx(model, export_dir)
+
+        self.sessions = {
+            name: onnxruntime.InferenceSession(str(export_dir / f"{name}.onnx"), providers=["CPUExecutionProvider"])
+            for name in self.GRAPHS
+        }
+        model.encoder = OnnxEncoder(self.sessions["encoder"])
+        return model
+
+    def create_inference(self, model, initial_token_length):
+        return OnnxInference(self.sessions["cross_attention"], self.sessions["decoder"], model.dims)
+
+
+BACKENDS = {
+    "pytorch": PyTorchBackend,
+    "onnx": OnnxBackend,
+}
+
+
+def create_backend(name):
+    """Instancia o backend pelo nome usado nos perfis"""
+    if name not in BACKENDS:
+        raise ValueError(f"Backend inválido: {name} (opções: {', '.join(BACKENDS)})")
+    return BACKENDS[name]()
+
@@ -0,0 +1,252 @@
+import hashlib
+import importlib
+import os
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import torch
+from whisper.audio import N_SAMPLES, SAMPLE_RATE, log_mel_spectrogram
+
+from .config import Config
+from .resources import probe_duration
+
+_DIGEST_CHUNK = 1024 * 1024
+_digest_memo = {}
+
+
+def file_digest(path):
+    """Retorna o hash SHA-256 do conteúdo do arquivo (memorizado por tamanho/mtime)"""
+    path = Path(path)
+    stat = path.stat()
+    memo_key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+
+    digest = _digest_memo.get(memo_key)
+    if digest is None:
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(_DIGEST_CHUNK), b""):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()
+        _digest_memo[memo_key] = digest
+
+    return digest
+
+
+def enforce_size_limit(directory, max_bytes, pattern="*"):
+    """Remove os arquivos menos usados recentemente até caber no limite"""
+    entries = []
+    total = 0
+    for entry in Path(directory).glob(pattern):
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry))
+        total += stat.st_size
+
+    removed = 0
+    for _, size, entry in sorted(entries, key=lambda item: item[0]):
+        if total <= max_bytes:
+            break
+        try:
+            entry.unlink()
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+
+    return removed
+
+
+@contextmanager
+def precomputed_features(mel):
+    """Faz o model.transcribe usar um log-mel já calculado em vez de decodificar o áudio"""
+    transcribe_module = importlib.import_module("whisper.transcribe")
+    original = transcribe_module.log_mel_spectrogram
+    transcribe_module.log_mel_spectrogram = lambda *args, **kwargs: mel
+    try:
+        yield mel
+    finally:
+        transcribe_module.log_mel_spectrogram = original
+
+
+class FeatureCache:
+    """Cache em disco de espectrogramas log-mel, salvos como .npy mapeados em memória"""
+
+    def __init__(self, cache_dir=None, max_mb=None, audio_cache=None):
+        self.cache_dir = Path(cache_dir or Config.FEATURE_CACHE_DIR)
+        self.audio_cache = audio_cache
+        self.max_bytes = int((max_mb or Config.FEATURE_CACHE_MAX_MB) * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, audio_file, n_mels):
+        """Caminho do arquivo de cache para um áudio e quantidade de bandas mel"""
+        return self.cache_dir / f"{file_digest(audio_file)}_{n_mels}.npy"
+
+    def load(self, audio_file, n_mels):
+        """Retorna o log-mel (com o padding do Whisper) do cache ou calculando-o"""
+        cache_file = self.path_for(audio_file, n_mels)
+
+        if cache_file.exists():
+            try:
+                # Copy-on-write: páginas só são lidas sob demanda e o arquivo nunca é alterado
+                features = np.load(cache_file, mmap_mode='c')
+                os.utime(cache_file)
+                self.hits += 1
+                return torch.from_numpy(features)
+            except (OSError, ValueError):
+                cache_file.unlink(missing_ok=True)
+
+        self.misses += 1
+        audio = self.audio_cache.load(audio_file) if self.audio_cache else str(audio_file)
+        mel = log_mel_spectrogram(audio, n_mels, padding=N_SAMPLES)
+        self._store(cache_file, mel.cpu().numpy())
+        return mel
+
+    def _store(self, cache_file, features):
+        """Grava o .npy de forma atômica e aplica o limite de tamanho"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, features.astype(np.float32, copy=False))
+            os.replace(tmp_path, cache_file)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+        enforce_size_limit(self.cache_dir, self.max_bytes, "*.npy")
+
+
+AUDIO_BYTES_PER_SECOND = SAMPLE_RATE * 4
+
+
+def convert_audio(audio_file, target_file, threads=0):
+    """Decodifica o áudio uma única vez para PCM float32 16 kHz mono sem cabeçalho (gravação atômica)"""
+    target_file = Path(target_file)
+    # Nome único por conversão: threads ou processos podem converter o mesmo conteúdo ao mesmo tempo
+    fd, tmp_file = tempfile.mkstemp(dir=target_file.parent, suffix=".tmp")
+    os.close(fd)
+    tmp_file = Path(tmp_file)
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", str(threads), "-y",
+        "-i", str(audio_file),
+        "-f", "f32le", "-ac", "1", "-acodec", "pcm_f32le", "-ar", str(SAMPLE_RATE),
+        str(tmp_file),
+    ]
+    try:
+        subprocess.run(cmd, capture_output=True, check=True)
+        os.replace(tmp_file, target_file)
+    except subprocess.CalledProcessError as e:
+        tmp_file.unlink(missing_ok=True)
+        raise RuntimeError(f"Falha ao converter {Path(audio_file).name}: {e.stderr.decode(errors='replace')}") from e
+    except BaseException:
+        tmp_file.unlink(missing_ok=True)
+        raise
+
+    return target_file
+
+
+def _map_audio(cache_file):
+    if os.path.getsize(cache_file) == 0:
+        return np.zeros(0, dtype=np.float32)
+    # Copy-on-write: o Whisper pode tratar o array como gravável sem alterar o cache
+    return np.memmap(cache_file, dtype=np.float32, mode='c')
+
+
+class AudioCache:
+    """Cache em disco do áudio normalizado (PCM float32, 16 kHz, mono), lido via memmap.
+
+    Cada entrada passa pelo ffmpeg uma única vez; novas tentativas, outros perfis, blocos,
+    log-mel e diarização leem o mesmo arquivo sem cópia.
+    """
+
+    SUFFIX = ".f32"
+
+    def __init__(self, cache_dir=None, max_mb=None):
+        self.cache_dir = Path(cache_dir or Config.AUDIO_CACHE_DIR)
+        self.max_bytes = int((max_mb or Config.AUDIO_CACHE_MAX_MB) * 1024 * 1024)
+        self.hits = 0
+        self.conversions = 0
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, audio_file):
+        """Caminho do áudio convertido no cache"""
+        return self.cache_dir / f"{file_digest(audio_file)}{self.SUFFIX}"
+
+    def load(self, audio_file):
+        """Retorna as amostras float32 do cache, convertendo o arquivo se necessário"""
+        cache_file = self.path_for(audio_file)
+
+        try:
+            audio = _map_audio(cache_file)
+            os.utime(cache_file)
+            self.hits += 1
+            return audio
+        except FileNotFoundError:
+            pass
+
+        convert_audio(audio_file, cache_file)
+        self.conversions += 1
+        audio = _map_audio(cache_file)
+        enforce_size_limit(self.cache_dir, self.max_bytes, f"*{self.SUFFIX}")
+        return audio
+
+    def prefetch(self, audio_files, workers=None):
+        """Converte em paralelo os arquivos que ainda não estão no cache.
+
+        Cada conversão já é um processo ffmpeg; as threads do pool só esperam por ele, então
+        não há cópia do processo (nem do modelo) por worker. Para na quantidade que cabe no
+        limite do cache, contando as entradas pendentes que já estão lá, para não expulsar
+        conversões que ainda vão ser usadas; o restante é convertido sob demanda.
+        """
+        pending = []
+        queued = set()
+        budget = self.max_bytes
+        for audio_file in audio_files:
+            cache_file = self.path_for(audio_file)
+            if cache_file in queued:
+                # Mesmo conteúdo de outro arquivo da lista: uma conversão serve para os dois
+                continue
+            try:
+                budget -= cache_file.stat().st_size
+                # Mais recente no LRU: não pode ser expulso pelas conversões abaixo
+                os.utime(cache_file)
+                continue
+            except FileNotFoundError:
+                pass
+            budget -= probe_duration(audio_file) * AUDIO_BYTES_PER_SECOND
+            if budget < 0:
+                break
+            pending.append((audio_file, cache_file))
+            queued.add(cache_file)
+
+        if not pending:
+            return 0
+
+        cpus = os.cpu_count() or 1
+        workers = min(len(pending), workers or Config.AUDIO_CACHE_WORKERS or min(4, cpus))
+        # Divide as CPUs entre os ffmpeg em paralelo em vez de cada um usar todas
+        threads = max(1, cpus // workers)
+        converted = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(convert_audio, audio_file, cache_file, threads): audio_file
+                for audio_file, cache_file in pending
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    converted += 1
+                except (RuntimeError, OSError) as e:
+                    # O arquivo é convertido de novo sob demanda, quando for transcrito
+                    print(f"   ⚠️ {futures[future].name}: {e}")
+
+        self.conversions += converted
+        enforce_size_limit(self.cache_dir, self.max_bytes, f"*{self.SUFFIX}")
+        return converted
@@ -1,5 +1,5 @@
 from pathlib import Path
-import json
+from .profiles import ProfileStore
 
 class Config:
     PROJECT_ROOT = Path(__file__).parent.parent
@@ -8,6 +8,8 @@ class Config:
     OUTPUT_DIR = DATA_DIR / "output"
     PROFILES_DIR = PROJECT_ROOT / "profiles"
     PROFILES_FILE = PROFILES_DIR / "profiles.json"
+    CACHE_DIR = DATA_DIR / "cache"
+    FEATURE_CACHE_DIR = CACHE_DIR / "features"
     
     AVAILABLE_MODELS = ["tiny", "base", "small", "medium", "large", "large-v3"]
     
@@ -18,6 +20,57 @@ class Config:
     
     SUPPORTED_AUDIO_FORMATS = [".mp3", ".wav", ".m4a", ".flac", ".opus"]
     
+    DEFAULT_BACKEND = "pytorch"
+    ONNX_MODELS_DIR = DATA_DIR / "models" / "onnx"
+    
+    DEFAULT_DECODER = "stock"
+    # Saída antecipada do beam search "fast" (margem na log-prob média por token, ex.: 0.5).
+    # Com perdas: pode mudar o texto em relação ao beam search completo. None: desativada
+    DECODER_EARLY_EXIT_MARGIN = None
+    
+    REPETITION_GUARD = True
+    REPETITION_MAX_PERIOD = 20  # tamanho máximo (em tokens) da frase repetida
+    REPETITION_MIN_REPEATS = 4
+    REPETITION_MIN_SPAN = 16  # tokens repetidos antes de considerar laço (ex.: 16x uma palavra)
+    REPETITION_RETRY_TEMPERATURE = 0.4  # None: só corta a repetição, sem retranscrever a janela
+    
+    WORD_TIMESTAMPS = False
+    
+    DIARIZATION_ENABLED = False
+    DIARIZATION_SPEAKERS = None  # None: estima pelo limiar de similaridade
+    DIARIZATION_THRESHOLD = 0.5
+    DIARIZATION_WINDOW_SECONDS = 1.5
+    DIARIZATION_VAD_RATIO = 0.3
+    DIARIZATION_MIN_SPEECH_SECONDS = 0.3
+    DIARIZATION_MIN_GAP_SECONDS = 0.3
+    DIARIZATION_MAX_WINDOWS = 1000
+    
+    MEMORY_LIMIT_MB = None  # None: calcula a partir da memória disponível
+    MEMORY_AUTO_FRACTION = 0.9
+    
+    FEATURE_CACHE_ENABLED = True
+    FEATURE_CACHE_MAX_MB = 2048
+    
+    AUDIO_CACHE_ENABLED = True
+    AUDIO_CACHE_DIR = CACHE_DIR / "audio"
+    AUDIO_CACHE_MAX_MB = 8192  # ~9 h de áudio em float32 16 kHz
+    AUDIO_CACHE_WORKERS = None  # None: até 4 conversões ffmpeg em paralelo
+    
+    SEARCH_INDEX_ENABLED = True
+    SEARCH_INDEX_FILE = DATA_DIR / "transcripts.db"
+    
+    LIVE_STEP_SECONDS = 1.0
+    LIVE_MAX_BUFFER_SECONDS = 15.0
+    
+    JOBS_DIR = DATA_DIR / "jobs"
+    LEASE_TTL_SECONDS = 120
+    LEASE_HEARTBEAT_SECONDS = 20
+    
+    SWEEP_SAMPLES_DIR = DATA_DIR / "samples"
+    SWEEP_REPORT_FILE = DATA_DIR / "sweep_report.json"
+    
+    _profile_store = None
+    
     @classmethod
     def ensure_directories(cls):
         """Cria os diretórios necessários se não existirem"""
@@ -26,12 +79,19 @@ class Config:
         cls.PROFILES_DIR.mkdir(parents=True, exist_ok=True)
         
         if not cls.PROFILES_FILE.exists():
-            cls._create_default_profiles()
+            cls.profile_store().load()
     
     @classmethod
-    def _create_default_profiles(cls):
-        """Cria perfis padrão"""
-        default_profiles = {
+    def profile_store(cls):
+        """Store de perfis do processo (cache compartilhado entre todas as chamadas)"""
+        if cls._profile_store is None or cls._profile_store.path != cls.PROFILES_FILE:
+            cls._profile_store = ProfileStore(cls.PROFILES_FILE, cls._default_profiles())
+        return cls._profile_store
+    
+    @classmethod
+    def _default_profiles(cls):
+        """Perfis padrão"""
+        return {
             "Rápido": {
                 "model": "tiny",
                 "beam_size": 1,
@@ -61,55 +121,63 @@ class Config:
                 "description": "Máxima qualidade possível (mais lento)"
             }
         }
-        
-        with open(cls.PROFILES_FILE, 'w', encoding='utf-8') as f:
-            json.dump(default_profiles, f, indent=4, ensure_ascii=False)
     
     @classmethod
     def load_profiles(cls):
         """Carrega todos os perfis salvos"""
-        cls.ensure_directories()
-        
-        try:
-            with open(cls.PROFILES_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            cls._create_default_profiles()
-            return cls.load_profiles()
+        return cls.profile_store().load()
     
     @classmethod
     def save_profiles(cls, profiles):
         """Salva perfis no arquivo"""
-        cls.ensure_directories()
+        def replace(current):
+            current.clear()
+            current.update(profiles)
         
-        with open(cls.PROFILES_FILE, 'w', encoding='utf-8') as f:
-            json.dump(profiles, f, indent=4, ensure_ascii=False)
+        cls.profile_store().update(replace)
     
     @classmethod
-    def save_profile(cls, name, params, description=""):
-        """Salva um perfil específico"""
-        profiles = cls.load_profiles()
-        profiles[name] = {
-            "model": params["model"],
-            "beam_size": params["beam_size"],
-            "best_of": params["best_of"],
-            "temperature": params["temperature"],
-            "description": description
-        }
-        cls.save_profiles(profiles)
+    def save_profile(cls, name, params, description="", replace=False):
+        """Salva um perfil específico (replace=True descarta as chaves do perfil anterior)"""
+        def save(profiles):
+            profiles[name] = {
+                **({} if replace else profiles.get(name, {})),
+                "model": params["model"],
+                "beam_size": params["beam_size"],
+                "best_of": params["best_of"],
+                "temperature": params["temperature"],
+                "description": description
+            }
+        
+        cls.profile_store().update(save)
     
     @classmethod
     def get_profile(cls, name):
         """Retorna um perfil específico"""
-        profiles = cls.load_profiles()
-        return profiles.get(name)
+        return cls.load_profiles().get(name)
+    
+    @classmethod
+    def get_default_params(cls):
+        """Retorna os parâmetros de execução padrão"""
+        return {
+            "model": cls.DEFAULT_MODEL,
+            "beam_size": cls.DEFAULT_BEAM_SIZE,
+            "best_of": cls.DEFAULT_BEST_OF,
+            "temperature": cls.DEFAULT_TEMPERATURE,
+        }
+    
+    @classmethod
+    def get_profile_params(cls, name):
+        """Retorna os parâmetros de execução de um perfil salvo"""
+        profile = cls.get_profile(name)
+        if profile is None:
+            return None
+        
+        params = {key: value for key, value in profile.items() if key != "description"}
+        params["profile_name"] = name
+        return params
     
     @classmethod
     def delete_profile(cls, name):
         """Remove um perfil"""
-        profiles = cls.load_profiles()
-        if name in profiles:
-            del profiles[name]
-            cls.save_profiles(profiles)
-            return True
-        return False
\ No newline at end of file
+        return cls.profile_store().update(lambda profiles: profiles.pop(name, None) is not None)
\ No newline at end of file
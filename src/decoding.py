@@ -0,0 +1,325 @@
+import time
+import types
+from dataclasses import replace
+
+import torch
+import torch.nn.functional as F
+from whisper.decoding import BeamSearchDecoder, DecodingOptions, DecodingTask, LogitFilter
+from whisper.utils import compression_ratio
+
+from .config import Config
+
+DECODER_ENGINES = ["stock", "fast"]
+
+
+class DecodingStats:
+    """Contadores acumulados pelos motores de decodificação durante uma execução"""
+
+    def __init__(self):
+        self.windows = 0
+        self.early_exits = 0
+        self.loops = 0
+        self.retries = 0
+        self.steps_saved = 0
+        self.decode_steps = 0
+        self.decode_seconds = 0.0
+
+    @property
+    def seconds_saved(self):
+        """Tempo de decodificação economizado, estimado pelo custo médio de um passo"""
+        if not self.decode_steps:
+            return 0.0
+        return self.steps_saved * self.decode_seconds / self.decode_steps
+
+
+def find_repetition(tokens):
+    """Procura um laço no fim da sequência: retorna (período, início do laço) ou None
+
+    Um laço é um n-grama de até REPETITION_MAX_PERIOD tokens repetido seguidamente pelo
+    menos REPETITION_MIN_REPEATS vezes, cobrindo no mínimo REPETITION_MIN_SPAN tokens.
+    """
+    n = len(tokens)
+    for period in range(1, Config.REPETITION_MAX_PERIOD + 1):
+        repeats = max(Config.REPETITION_MIN_REPEATS, -(-Config.REPETITION_MIN_SPAN // period))
+        span = period * repeats
+        if span > n:
+            break
+        if tokens[-1] != tokens[-1 - period]:
+            continue
+        if all(tokens[i] == tokens[i - period] for i in range(n - span + period, n)):
+            start = n - span
+            while start > 0 and tokens[start - 1] == tokens[start - 1 + period]:
+                start -= 1
+            return period, start
+    return None
+
+
+def trim_repetition(tokens, eot):
+    """Corta um laço no fim dos tokens mantendo uma única ocorrência (None se não houver laço)"""
+    positions = [i for i, token in enumerate(tokens) if token < eot]
+    loop = find_repetition([tokens[i] for i in positions])
+    if loop is None:
+        return None
+    period, start = loop
+    return tokens[:positions[start + period - 1] + 1]
+
+
+class RepetitionGuard(LogitFilter):
+    """Força o fim do texto nas hipóteses que entraram em laço de repetição.
+
+    Roda a cada passo da decodificação sobre a cauda de cada hipótese (tokens de texto,
+    sem timestamps), então a janela termina assim que o laço aparece em vez de repetir
+    a frase até o limite de tokens.
+    """
+
+    def __init__(self, sample_begin, eot):
+        self.sample_begin = sample_begin
+        self.eot = eot
+        # Timestamps intercalados ocupam espaço na cauda: olhar o dobro do maior laço possível
+        self.window = 2 * max(
+            Config.REPETITION_MAX_PERIOD * Config.REPETITION_MIN_REPEATS, Config.REPETITION_MIN_SPAN
+        )
+        self.steps = 0
+        self.loops = 0
+
+    def apply(self, logits, tokens):
+        self.steps += 1
+        sampled = tokens[:, self.sample_begin:]
+        if sampled.shape[-1] < Config.REPETITION_MIN_SPAN:
+            return
+
+        for row, sequence in enumerate(sampled[:, -self.window:].tolist()):
+            if sequence[-1] == self.eot:
+                continue
+            if find_repetition([token for token in sequence if token < self.eot]):
+                logits[row] = -float("inf")
+                logits[row, self.eot] = 0
+                self.loops += 1
+
+
+class FastBeamSearchDecoder(BeamSearchDecoder):
+    """Beam search com seleção vetorizada e saída antecipada opcional.
+
+    Produz os mesmos candidatos do BeamSearchDecoder do Whisper, mas faz uma única cópia
+    dispositivo→host por passo (em vez de um .item() por candidato). Com early_exit_margin,
+    a busca termina quando a melhor hipótese finalizada supera todas as vivas por essa margem
+    na pontuação normalizada pelo comprimento usada pelo ranker. A saída antecipada é uma
+    heurística com perdas: a média de uma hipótese viva ainda pode subir com novos tokens e
+    vencer, então o texto pode mudar em relação ao beam search completo.
+    """
+
+    def __init__(self, beam_size, eot, inference, patience=None, early_exit_margin=None, stats=None,
+                 sample_begin=0, length_penalty=None):
+        super().__init__(beam_size, eot, inference, patience)
+        self.early_exit_margin = early_exit_margin
+        self.stats = stats
+        self.sample_begin = sample_begin
+        self.length_penalty = length_penalty
+        self.exited_early = False
+
+    def reset(self):
+        super().reset()
+        self.exited_early = False
+
+    def _normalized(self, logprob, length):
+        """Mesma pontuação do MaximumLikelihoodRanker"""
+        length = max(1, length)
+        penalty = length if self.length_penalty is None else ((5 + length) / 6) ** self.length_penalty
+        return logprob / penalty
+
+    def update(self, tokens, logits, sum_logprobs):
+        if tokens.shape[0] % self.beam_size != 0:
+            raise ValueError(f"{tokens.shape}[0] % {self.beam_size} != 0")
+
+        n_audio = tokens.shape[0] // self.beam_size
+        if self.finished_sequences is None:
+            self.finished_sequences = [{} for _ in range(n_audio)]
+
+        n_candidates = self.beam_size + 1
+        logprobs = F.log_softmax(logits.float(), dim=-1)
+        top_logprobs, top_tokens = logprobs.topk(n_candidates)
+        scores = (sum_logprobs[:, None] + top_logprobs).view(n_audio, -1)
+        order = scores.argsort(dim=-1, descending=True)
+
+        # Beams com o mesmo prefixo (ex.: no primeiro passo) geram candidatos repetidos
+        _, prefix_ids = torch.unique(tokens, dim=0, return_inverse=True)
+
+        scores, order, top_tokens, prefix_ids = (
+            scores.tolist(), order.tolist(), top_tokens.tolist(), prefix_ids.tolist()
+        )
+
+        source_indices, next_tokens, next_scores, finished_sequences = [], [], [], []
+        for i in range(n_audio):
+            seen, finished, saved = set(), {}, 0
+
+            for flat_index in order[i]:
+                beam, candidate = divmod(flat_index, n_candidates)
+                source = i * self.beam_size + beam
+                token = top_tokens[source][candidate]
+
+                if (prefix_ids[source], token) in seen:
+                    continue
+                seen.add((prefix_ids[source], token))
+
+                if token == self.eot:
+                    finished[source] = scores[i][flat_index]
+                    continue
+
+                source_indices.append(source)
+                next_tokens.append(token)
+                next_scores.append(scores[i][flat_index])
+                saved += 1
+                if saved == self.beam_size:
+                    break
+
+            finished_sequences.append(finished)
+
+        for previously_finished, newly_finished in zip(self.finished_sequences, finished_sequences):
+            for source in sorted(newly_finished, key=newly_finished.get, reverse=True):
+                if len(previously_finished) >= self.max_candidates:
+                    break
+                sequence = tuple(tokens[source].tolist() + [self.eot])
+                previously_finished[sequence] = newly_finished[source]
+
+        device = tokens.device
+        tokens = torch.cat(
+            [tokens[source_indices], torch.tensor(next_tokens, device=device)[:, None]], dim=-1
+        )
+        sum_logprobs.copy_(torch.tensor(next_scores, device=sum_logprobs.device))
+        self.inference.rearrange_kv_cache(source_indices)
+
+        completed = all(len(sequences) >= self.max_candidates for sequences in self.finished_sequences)
+
+        if not completed and self.early_exit_margin is not None:
+            live_length = tokens.shape[-1] - self.sample_begin
+            best_live = [
+                self._normalized(max(next_scores[i * self.beam_size:(i + 1) * self.beam_size]), live_length)
+                for i in range(n_audio)
+            ]
+            best_finished = [
+                max((self._normalized(score, len(sequence) - 1 - self.sample_begin)
+                     for sequence, score in sequences.items()), default=None)
+                for sequences in self.finished_sequences
+            ]
+            completed = all(
+                finished is not None and finished - live >= self.early_exit_margin
+                for finished, live in zip(best_finished, best_live)
+            )
+            if completed:
+                self.exited_early = True
+                if self.stats:
+                    self.stats.early_exits += 1
+
+        return tokens, completed
+
+    def finalize(self, preceding_tokens, sum_logprobs):
+        if self.exited_early:
+            # As hipóteses vivas foram descartadas por serem claramente piores: não completar com elas
+            tokens = [[torch.tensor(seq) for seq in sequences] for sequences in self.finished_sequences]
+            return tokens, [list(sequences.values()) for sequences in self.finished_sequences]
+        return super().finalize(preceding_tokens, sum_logprobs)
+
+
+class EngineDecodingTask(DecodingTask):
+    """DecodingTask do Whisper com o motor e o backend escolhidos e, opcionalmente, a proteção contra repetição"""
+
+    def __init__(self, model, options, engine="stock", stats=None, repetition_guard=False, backend=None):
+        super().__init__(model, options)
+
+        if backend is not None and backend.replaces_decoder:
+            self.inference = backend.create_inference(model, len(self.initial_tokens))
+            if isinstance(self.decoder, BeamSearchDecoder):
+                self.decoder.inference = self.inference
+
+        self.repetition_guard = None
+        if repetition_guard:
+            self.repetition_guard = RepetitionGuard(self.sample_begin, self.tokenizer.eot)
+            self.logit_filters.append(self.repetition_guard)
+
+        if engine == "fast" and options.beam_size is not None:
+            self.decoder = FastBeamSearchDecoder(
+                options.beam_size,
+                self.tokenizer.eot,
+                self.inference,
+                options.patience,
+                early_exit_margin=Config.DECODER_EARLY_EXIT_MARGIN,
+                stats=stats,
+                sample_begin=self.sample_begin,
+                length_penalty=options.length_penalty,
+            )
+
+
+def _run_guarded_task(model, mel, options, engine, stats, backend):
+    """Executa uma decodificação com a proteção ativa, contabilizando passos e tempo"""
+    task = EngineDecodingTask(model, options, engine, stats, repetition_guard=True, backend=backend)
+
+    start = time.perf_counter()
+    results = task.run(mel)
+    stats.decode_seconds += time.perf_counter() - start
+
+    guard = task.repetition_guard
+    stats.decode_steps += guard.steps
+    if guard.loops:
+        stats.steps_saved += max(0, task.sample_len - guard.steps)
+
+    return task, results
+
+
+def _decode_with_guard(model, mel, options, engine, stats, backend):
+    """Decodifica e trata apenas as janelas que terminaram em laço.
+
+    A janela em laço é retranscrita por amostragem em REPETITION_RETRY_TEMPERATURE; se a
+    nova tentativa também repetir (ou o retry estiver desligado), fica o texto original
+    com a repetição cortada, que passa no filtro de taxa de compressão do Whisper.
+    """
+    task, results = _run_guarded_task(model, mel, options, engine, stats, backend)
+    eot = task.tokenizer.eot
+    retry_temperature = Config.REPETITION_RETRY_TEMPERATURE
+
+    for i, result in enumerate(results):
+        trimmed = trim_repetition(result.tokens, eot)
+        if trimmed is None:
+            continue
+        stats.loops += 1
+
+        if retry_temperature is not None and options.temperature < retry_temperature:
+            retry_options = replace(options, temperature=retry_temperature, beam_size=None, patience=None)
+            _, (retry,) = _run_guarded_task(model, mel[i:i + 1], retry_options, engine, stats, backend)
+            if trim_repetition(retry.tokens, eot) is None:
+                stats.retries += 1
+                results[i] = retry
+                continue
+
+        text = task.tokenizer.decode(trimmed).strip()
+        results[i] = replace(result, tokens=trimmed, text=text, compression_ratio=compression_ratio(text))
+
+    return results
+
+
+def install_decoding_engine(model, engine, stats=None, repetition_guard=False, backend=None):
+    """Seleciona o motor (e a inferência do backend) usados por model.decode e model.transcribe"""
+    if engine not in DECODER_ENGINES:
+        raise ValueError(f"Motor de decodificação inválido: {engine} (opções: {', '.join(DECODER_ENGINES)})")
+
+    model.__dict__.pop("decode", None)
+    if engine == "stock" and not repetition_guard and not (backend and backend.replaces_decoder):
+        return model
+
+    stats = stats or DecodingStats()
+
+    @torch.no_grad()
+    def decode(self, mel, options=DecodingOptions(), **kwargs):
+        if single := mel.ndim == 2:
+            mel = mel.unsqueeze(0)
+        if kwargs:
+            options = replace(options, **kwargs)
+
+        stats.windows += 1
+        if repetition_guard:
+            result = _decode_with_guard(self, mel, options, engine, stats, backend)
+        else:
+            result = EngineDecodingTask(self, options, engine, stats, backend=backend).run(mel)
+        return result[0] if single else result
+
+    model.decode = types.MethodType(decode, model)
+    return model
@@ -0,0 +1,179 @@
+import numpy as np
+from whisper.audio import HOP_LENGTH, SAMPLE_RATE
+
+from .config import Config
+
+FRAMES_PER_SECOND = SAMPLE_RATE // HOP_LENGTH
+
+
+def _seconds_to_frames(seconds):
+    return max(1, int(round(seconds * FRAMES_PER_SECOND)))
+
+
+def detect_speech(mel):
+    """Regiões com fala (início, fim em frames) por limiar adaptativo sobre a energia do log-mel"""
+    if mel.shape[-1] == 0:
+        return []
+
+    energy = mel.mean(axis=0)
+    kernel = np.ones(_seconds_to_frames(0.3)) / _seconds_to_frames(0.3)
+    energy = np.convolve(energy, kernel, mode='same')
+
+    floor, peak = np.percentile(energy, [10, 95])
+    if peak - floor < 1e-3:
+        return []
+    speech = energy > floor + Config.DIARIZATION_VAD_RATIO * (peak - floor)
+
+    bounds = np.concatenate([[0], np.flatnonzero(np.diff(speech.astype(np.int8))) + 1, [len(speech)]])
+    min_gap = _seconds_to_frames(Config.DIARIZATION_MIN_GAP_SECONDS)
+    min_speech = _seconds_to_frames(Config.DIARIZATION_MIN_SPEECH_SECONDS)
+
+    regions = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if not speech[start]:
+            continue
+        if regions and start - regions[-1][1] < min_gap:
+            regions[-1] = (regions[-1][0], int(end))
+        else:
+            regions.append((int(start), int(end)))
+
+    return [(start, end) for start, end in regions if end - start >= min_speech]
+
+
+def cluster_embeddings(embeddings, num_speakers=None, threshold=None):
+    """Agrupamento aglomerativo (ligação média, similaridade de cosseno); retorna um rótulo por linha.
+
+    Com num_speakers, agrupa até sobrar esse número de locutores; senão, para quando a
+    maior similaridade entre grupos fica abaixo do limiar. Acima de DIARIZATION_MAX_WINDOWS
+    janelas, o agrupamento roda sobre uma amostra uniforme e as demais vão para o centroide mais próximo.
+    """
+    threshold = Config.DIARIZATION_THRESHOLD if threshold is None else threshold
+    count = len(embeddings)
+    if count <= 1:
+        return np.zeros(count, dtype=np.int64)
+
+    sample = np.unique(np.linspace(0, count - 1, min(count, Config.DIARIZATION_MAX_WINDOWS)).round().astype(np.int64))
+    points = embeddings[sample]
+    n = len(points)
+
+    similarity = points @ points.T
+    np.fill_diagonal(similarity, -np.inf)
+    sizes = np.ones(n)
+    labels = np.arange(n)
+    clusters = n
+
+    while clusters > 1:
+        i, j = divmod(int(np.argmax(similarity)), n)
+        if num_speakers:
+            if clusters <= num_speakers:
+                break
+        elif similarity[i, j] < threshold:
+            break
+
+        # Lance-Williams: a similaridade média do grupo unido é a média ponderada das duas linhas
+        similarity[i] = (sizes[i] * similarity[i] + sizes[j] * similarity[j]) / (sizes[i] + sizes[j])
+        similarity[:, i] = similarity[i]
+        similarity[i, i] = -np.inf
+        similarity[j] = -np.inf
+        similarity[:, j] = -np.inf
+        sizes[i] += sizes[j]
+        labels[labels == j] = i
+        clusters -= 1
+
+    _, labels = np.unique(labels, return_inverse=True)
+    if n == count:
+        return labels
+
+    centroids = np.stack([points[labels == label].mean(axis=0) for label in range(labels.max() + 1)])
+    centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-8
+    return np.argmax(embeddings @ centroids.T, axis=1)
+
+
+class SpeakerDiarizer:
+    """Segmentação por locutor a partir do log-mel já calculado para a transcrição.
+
+    Cada região de fala é dividida em janelas curtas, descritas pela média e desvio do
+    log-mel; as janelas são agrupadas por similaridade e viram turnos (início, fim, locutor).
+    """
+
+    def __init__(self, num_speakers=None, threshold=None):
+        self.num_speakers = num_speakers
+        self.threshold = threshold
+        self.windows = []
+        self.embeddings = []
+
+    def add_features(self, mel, offset=0.0, n_frames=None):
+        """Acrescenta as janelas de um log-mel (n_mels, frames); offset em segundos para blocos"""
+        mel = np.asarray(mel[:, :n_frames], dtype=np.float32)
+        window = _seconds_to_frames(Config.DIARIZATION_WINDOW_SECONDS)
+        step = max(1, window // 2)
+
+        for start, end in detect_speech(mel):
+            for window_start in range(start, max(start + 1, end - window + step), step):
+                window_end = min(window_start + window, end)
+                frames = mel[:, window_start:window_end]
+                self.windows.append((offset + window_start / FRAMES_PER_SECOND, offset + window_end / FRAMES_PER_SECOND))
+                self.embeddings.append(np.concatenate([frames.mean(axis=1), frames.std(axis=1)]))
+
+    def turns(self):
+        """Turnos (início, fim, locutor) em segundos; locutores numerados a partir de 1 por ordem de fala"""
+        if not self.windows:
+            return []
+
+        embeddings = np.stack(self.embeddings)
+        embeddings -= embeddings.mean(axis=0)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-8
+        labels = cluster_embeddings(embeddings, self.num_speakers, self.threshold)
+
+        speakers = {}
+        turns = []
+        for index, ((start, end), label) in enumerate(zip(self.windows, labels)):
+            speaker = speakers.setdefault(int(label), len(speakers) + 1)
+            if index and start < self.windows[index - 1][1]:
+                # Janelas sobrepostas: a fronteira fica no meio da sobreposição
+                start = (start + self.windows[index - 1][1]) / 2
+            if turns and turns[-1][2] == speaker and start - turns[-1][1] <= Config.DIARIZATION_MIN_GAP_SECONDS:
+                turns[-1] = (turns[-1][0], end, speaker)
+                continue
+            if turns and turns[-1][1] > start:
+                turns[-1] = (turns[-1][0], start, turns[-1][2])
+            turns.append((start, end, speaker))
+
+        return turns
+
+
+def assign_speakers(segments, turns):
+    """Marca cada segmento com o locutor de maior sobreposição (ou do turno mais próximo)"""
+    if not turns:
+        return segments
+
+    for segment in segments:
+        overlaps = {}
+        for start, end, speaker in turns:
+            overlap = min(end, segment["end"]) - max(start, segment["start"])
+            if overlap > 0:
+                overlaps[speaker] = overlaps.get(speaker, 0.0) + overlap
+
+        if overlaps:
+            segment["speaker"] = max(overlaps, key=overlaps.get)
+        else:
+            middle = (segment["start"] + segment["end"]) / 2
+            segment["speaker"] = min(turns, key=lambda turn: min(abs(turn[0] - middle), abs(turn[1] - middle)))[2]
+
+    return segments
+
+
+def format_speaker_transcript(segments):
+    """Texto com uma linha por turno: "[Locutor N] ..." """
+    lines = []
+    current = None
+    for segment in segments:
+        text = segment["text"].strip()
+        if not text:
+            continue
+        if segment.get("speaker") != current or not lines:
+            current = segment.get("speaker")
+            lines.append(f"[Locutor {current}] {text}")
+        else:
+            lines[-1] += f" {text}"
+    return "\n".join(lines)
@@ -0,0 +1,235 @@
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import torch
+
+from .config import Config
+from .resources import ResourceGovernor
+
+
+class LeaseManager:
+    """Reserva arquivos entre vários nós usando arquivos de lease em um diretório compartilhado.
+
+    Cada lease é criado com O_CREAT | O_EXCL (atômico inclusive em NFS), renovado por
+    heartbeat (mtime) e pode ser retomado por outro nó quando passa do tempo de expiração.
+    """
+
+    def __init__(self, jobs_dir=None, node_id=None, ttl=None, heartbeat_interval=None):
+        self.jobs_dir = Path(jobs_dir or Config.JOBS_DIR)
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.ttl = ttl or Config.LEASE_TTL_SECONDS
+        self.heartbeat_interval = heartbeat_interval or Config.LEASE_HEARTBEAT_SECONDS
+        self.held = set()
+        self.lost = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._clock_file = self.jobs_dir / f".clock-{self.node_id}"
+
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+
+    def start(self):
+        """Inicia o heartbeat dos leases mantidos por este nó"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._heartbeat, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Para o heartbeat e libera todos os leases ainda mantidos"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+        with self._lock:
+            held = list(self.held)
+        for lease_file in held:
+            if self._owner(lease_file) == self.node_id:
+                lease_file.unlink(missing_ok=True)
+        self.held.clear()
+        self._clock_file.unlink(missing_ok=True)
+
+    def lease_path(self, audio_file):
+        """Caminho do arquivo de lease de um áudio"""
+        return self.jobs_dir / f"{Path(audio_file).name}.lease"
+
+    def claim(self, audio_file):
+        """Tenta reservar o arquivo; retorna False se outro nó tiver um lease válido"""
+        lease_file = self.lease_path(audio_file)
+
+        if self._create(lease_file):
+            return True
+
+        if not self._reclaim_if_expired(lease_file):
+            return False
+
+        return self._create(lease_file)
+
+    def release(self, audio_file):
+        """Libera o lease de um arquivo, se ainda pertencer a este nó"""
+        lease_file = self.lease_path(audio_file)
+        with self._lock:
+            if lease_file not in self.held:
+                return
+            self.held.discard(lease_file)
+
+        if self._owner(lease_file) == self.node_id:
+            lease_file.unlink(missing_ok=True)
+
+    def _create(self, lease_file):
+        """Cria o lease atomicamente; falha se já existir"""
+        try:
+            fd = os.open(lease_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({
+                "node": self.node_id,
+                "host": socket.gethostname(),
+                "pid": os.getpid(),
+                "claimed_at": time.time(),
+            }, f)
+
+        with self._lock:
+            self.held.add(lease_file)
+        return True
+
+    def _reclaim_if_expired(self, lease_file):
+        """Retoma um lease expirado (nó travado ou finalizado sem liberar)"""
+        try:
+            before = lease_file.stat()
+        except FileNotFoundError:
+            return True
+
+        if self._server_now() - before.st_mtime < self.ttl:
+            return False
+
+        tombstone = lease_file.with_name(f"{lease_file.name}.stale-{uuid.uuid4().hex}")
+        try:
+            os.rename(lease_file, tombstone)
+        except FileNotFoundError:
+            return True
+
+        after = tombstone.stat()
+        if (after.st_ino, after.st_mtime) != (before.st_ino, before.st_mtime):
+            # Outro nó retomou o lease entre o stat e o rename: devolve o lease válido
+            try:
+                os.link(tombstone, lease_file)
+            except FileExistsError:
+                pass
+            tombstone.unlink(missing_ok=True)
+            return False
+
+        print(f"♻️ Lease expirado retomado: {lease_file.name} (nó anterior: {self._owner(tombstone) or '?'})")
+        tombstone.unlink(missing_ok=True)
+        return True
+
+    def _owner(self, lease_file):
+        """Nó dono do lease, lido do conteúdo do arquivo"""
+        try:
+            with open(lease_file, 'r', encoding='utf-8') as f:
+                return json.load(f).get("node")
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _server_now(self):
+        """Horário do servidor de arquivos, evitando diferenças de relógio entre nós"""
+        self._clock_file.touch()
+        return self._clock_file.stat().st_mtime
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            with self._lock:
+                held = list(self.held)
+
+            for lease_file in held:
+                if self._owner(lease_file) != self.node_id:
+                    if lease_file not in self.lost:
+                        print(f"⚠️ Lease perdido para outro nó: {lease_file.name}")
+                        self.lost.add(lease_file)
+                    continue
+                try:
+                    os.utime(lease_file)
+                except FileNotFoundError:
+                    pass
+
+
+def _run_worker(params, node_id, jobs_dir, ttl):
+    """Processo de trabalho: carrega o modelo e processa os arquivos que conseguir reservar"""
+    from .transcriber import AudioTranscriber
+
+    transcriber = AudioTranscriber(params)
+    transcriber.initialize()
+
+    with LeaseManager(jobs_dir=jobs_dir, node_id=node_id, ttl=ttl) as lease_manager:
+        transcriber.transcribe_files(lease_manager=lease_manager)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Processa a pasta de entrada em vários nós/processos com leases compartilhados")
+    parser.add_argument("--profile", help="Perfil salvo a usar (padrão: configuração padrão)")
+    parser.add_argument("--jobs-dir", default=str(Config.JOBS_DIR), help="Diretório compartilhado dos leases")
+    parser.add_argument("--node-id", default=None, help="Identificador deste nó (padrão: host-pid)")
+    parser.add_argument("--workers", type=int, default=1, help="Processos de trabalho neste nó")
+    parser.add_argument("--ttl", type=float, default=Config.LEASE_TTL_SECONDS, help="Expiração do lease em segundos")
+    args = parser.parse_args()
+
+    if args.profile:
+        params = Config.get_profile_params(args.profile)
+        if params is None:
+            print(f"❌ Perfil '{args.profile}' não encontrado.")
+            return
+    else:
+        params = Config.get_default_params()
+
+    workers = args.workers
+    if workers > 1:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        governor = ResourceGovernor(params["model"], device, params.get("memory_limit_mb", Config.MEMORY_LIMIT_MB))
+        workers = governor.max_workers(args.workers)
+        if workers < args.workers:
+            print(f"🧠 Limite de memória ({governor.limit_mb:.0f}MB) comporta {workers} processo(s); reduzindo de {args.workers}")
+        if governor.limit_mb is not None:
+            params = {**params, "memory_limit_mb": governor.limit_mb / workers}
+
+    node_id = args.node_id or f"{socket.gethostname()}-{os.getpid()}"
+    print(f"🌐 Nó {node_id}: {workers} processo(s), leases em {args.jobs_dir}")
+
+    if workers <= 1:
+        _run_worker(params, node_id, args.jobs_dir, args.ttl)
+        return
+
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=_run_worker, args=(params, f"{node_id}-w{i}", args.jobs_dir, args.ttl))
+        for i in range(1, workers + 1)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+        raise
+
+
+if __name__ == "__main__":
+    main()
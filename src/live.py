@@ -0,0 +1,275 @@
+import argparse
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+import wave
+
+import numpy as np
+from whisper.audio import SAMPLE_RATE
+
+from .config import Config
+from .transcriber import AudioTranscriber
+
+BYTES_PER_SAMPLE = 2
+READ_CHUNK_SECONDS = 0.1
+
+
+def _read_pcm_stream(stream, audio_queue, pace=False):
+    """Lê PCM s16le 16 kHz mono e envia blocos float32 para a fila (None marca o fim)"""
+    chunk_bytes = int(SAMPLE_RATE * READ_CHUNK_SECONDS) * BYTES_PER_SAMPLE
+    leftover = b""
+    start = time.time()
+    sent_samples = 0
+
+    try:
+        while True:
+            data = stream.read(chunk_bytes)
+            if not data:
+                break
+
+            data = leftover + data
+            usable = len(data) - len(data) % BYTES_PER_SAMPLE
+            leftover = data[usable:]
+            samples = np.frombuffer(data[:usable], np.int16).astype(np.float32) / 32768.0
+            if not len(samples):
+                continue
+
+            if pace:
+                # Reprodução em 1x: só entrega o bloco quando ele "aconteceria" em tempo real
+                sent_samples += len(samples)
+                delay = start + sent_samples / SAMPLE_RATE - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+            audio_queue.put(samples)
+    finally:
+        audio_queue.put(None)
+
+
+def open_source(source):
+    """Abre a fonte de áudio: stdin, pipe:CAMINHO, socket:CAMINHO ou replay:ARQUIVO.wav
+
+    Retorna (stream binário, se deve ser lido em ritmo de tempo real).
+    """
+    kind, _, target = source.partition(":")
+
+    if kind == "stdin":
+        return sys.stdin.buffer, False
+
+    if kind == "pipe":
+        if not os.path.exists(target):
+            os.mkfifo(target)
+        print(f"📡 Aguardando dados no pipe: {target}")
+        return open(target, 'rb'), False
+
+    if kind == "socket":
+        if os.path.exists(target):
+            os.unlink(target)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(target)
+        server.listen(1)
+        print(f"📡 Aguardando conexão no socket: {target}")
+        connection, _ = server.accept()
+        server.close()
+        return connection.makefile('rb'), False
+
+    if kind == "replay":
+        wav = wave.open(target, 'rb')
+        if (wav.getframerate(), wav.getnchannels(), wav.getsampwidth()) != (SAMPLE_RATE, 1, BYTES_PER_SAMPLE):
+            raise ValueError("O WAV de replay precisa ser PCM 16 bits, mono, 16 kHz")
+        return _WaveStream(wav), True
+
+    raise ValueError(f"Fonte inválida: {source}")
+
+
+class _WaveStream:
+    """Adapta wave.Wave_read para a interface read(n_bytes)"""
+
+    def __init__(self, wav):
+        self.wav = wav
+
+    def read(self, n_bytes):
+        return self.wav.readframes(n_bytes // BYTES_PER_SAMPLE)
+
+
+def _normalize_word(word):
+    return word.strip().lower().strip(".,!?;:…\"'")
+
+
+class LiveTranscriber:
+    """Transcrição contínua com buffer deslizante e política de concordância local.
+
+    A cada passo o buffer inteiro é retranscrito; as palavras em que duas hipóteses
+    consecutivas concordam (prefixo comum) são finalizadas, o restante é exibido como
+    parcial. O áudio já finalizado é descartado do início do buffer.
+    """
+
+    def __init__(self, transcriber, step_seconds=None, max_buffer_seconds=None):
+        self.transcriber = transcriber
+        self.step_seconds = step_seconds or Config.LIVE_STEP_SECONDS
+        self.max_buffer_seconds = max_buffer_seconds or Config.LIVE_MAX_BUFFER_SECONDS
+
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.buffer_offset = 0.0
+        self.committed = []
+        self.previous_hypothesis = []
+
+        self.stream_start = None
+        self.first_partial_latency = None
+        self.processing_time = 0.0
+        self.audio_seconds = 0.0
+        self.commit_delays = []
+
+    def run(self, source):
+        """Consome a fonte até o fim do stream, emitindo parciais e finais"""
+        stream, pace = open_source(source)
+        audio_queue = queue.Queue()
+        reader = threading.Thread(target=_read_pcm_stream, args=(stream, audio_queue, pace), daemon=True)
+        reader.start()
+
+        pending = 0
+        finished = False
+        while not finished:
+            chunks = [audio_queue.get()]
+            while not audio_queue.empty():
+                chunks.append(audio_queue.get_nowait())
+
+            if chunks[-1] is None:
+                finished = True
+                chunks.pop()
+
+            for chunk in chunks:
+                if self.stream_start is None:
+                    self.stream_start = time.time()
+                self.buffer = np.concatenate([self.buffer, chunk])
+                self.audio_seconds += len(chunk) / SAMPLE_RATE
+                pending += len(chunk)
+
+            if pending >= self.step_seconds * SAMPLE_RATE or (finished and pending):
+                pending = 0
+                self._process(final=finished)
+
+        if self.previous_hypothesis:
+            self._commit(self.previous_hypothesis)
+            self.previous_hypothesis = []
+        print()
+        self.print_stats()
+
+    def _transcribe_buffer(self):
+        """Transcreve o buffer atual e retorna palavras com tempos absolutos"""
+        options = self.transcriber._build_transcribe_options()
+        options.update({
+            "verbose": None,
+            "word_timestamps": True,
+            "initial_prompt": "".join(word["word"] for word in self.committed[-50:]) or None,
+        })
+
+        start = time.time()
+        result = self.transcriber.model.transcribe(self.buffer, **options)
+        self.processing_time += time.time() - start
+
+        return [
+            {**word, "start": word["start"] + self.buffer_offset, "end": word["end"] + self.buffer_offset}
+            for segment in result["segments"]
+            for word in segment.get("words", [])
+        ]
+
+    def _process(self, final=False):
+        hypothesis = self._transcribe_buffer()
+
+        agreed = 0
+        for previous, current in zip(self.previous_hypothesis, hypothesis):
+            if _normalize_word(previous["word"]) != _normalize_word(current["word"]):
+                break
+            agreed += 1
+
+        if final:
+            agreed = len(hypothesis)
+
+        self._commit(hypothesis[:agreed])
+        self.previous_hypothesis = hypothesis[agreed:]
+        self._emit_partial()
+        self._trim_buffer()
+
+    def _commit(self, words):
+        """Finaliza palavras e remove do buffer o áudio já confirmado"""
+        if not words:
+            return
+
+        now = time.time() - self.stream_start
+        self.commit_delays.extend(now - word["end"] for word in words)
+        self.committed.extend(words)
+
+        text = "".join(word["word"] for word in words).strip()
+        print(f"\r✅ [{words[0]['start']:7.2f}s] {text}\033[K")
+
+        cut = max(0.0, words[-1]["end"] - self.buffer_offset)
+        self.buffer = self.buffer[int(cut * SAMPLE_RATE):]
+        self.buffer_offset += cut
+
+    def _emit_partial(self):
+        if self.previous_hypothesis and self.first_partial_latency is None:
+            self.first_partial_latency = time.time() - self.stream_start
+
+        partial = "".join(word["word"] for word in self.previous_hypothesis).strip()
+        print(f"\r… {partial[-100:]}\033[K", end="", flush=True)
+
+    def _trim_buffer(self):
+        """Limita o buffer: sem concordância, finaliza à força a parte mais antiga"""
+        excess = len(self.buffer) / SAMPLE_RATE - self.max_buffer_seconds
+        if excess <= 0:
+            return
+
+        cutoff = self.buffer_offset + excess
+        forced = [word for word in self.previous_hypothesis if word["end"] <= cutoff]
+        if forced:
+            self.previous_hypothesis = self.previous_hypothesis[len(forced):]
+            self._commit(forced)
+        else:
+            self.buffer = self.buffer[int(excess * SAMPLE_RATE):]
+            self.buffer_offset = cutoff
+
+    def print_stats(self):
+        """Imprime latência da primeira parcial, fator de tempo real e atraso de finalização"""
+        print("\n📊 ESTATÍSTICAS DO MODO AO VIVO")
+        print(f"🎧 Áudio recebido: {self.audio_seconds:.1f}s")
+        if self.first_partial_latency is not None:
+            print(f"⚡ Latência da primeira parcial: {self.first_partial_latency:.2f}s")
+        if self.audio_seconds > 0:
+            print(f"⏱️ Fator de tempo real (processamento/áudio): {self.processing_time / self.audio_seconds:.2f}")
+        if self.commit_delays:
+            print(f"✅ Atraso de finalização: médio {np.mean(self.commit_delays):.2f}s, máximo {np.max(self.commit_delays):.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcrição ao vivo de um stream PCM s16le 16 kHz mono")
+    parser.add_argument("--source", default="stdin",
+                        help="stdin, pipe:CAMINHO, socket:CAMINHO ou replay:ARQUIVO.wav (reproduz em 1x)")
+    parser.add_argument("--profile", help="Perfil salvo a usar (padrão: configuração padrão)")
+    parser.add_argument("--step", type=float, default=Config.LIVE_STEP_SECONDS,
+                        help="Segundos de áudio novo entre atualizações")
+    args = parser.parse_args()
+
+    params = Config.get_profile_params(args.profile) if args.profile else Config.get_default_params()
+    if params is None:
+        print(f"❌ Perfil '{args.profile}' não encontrado.")
+        return
+
+    transcriber = AudioTranscriber(params)
+    transcriber.initialize()
+
+    print("🎙️ Modo ao vivo - Ctrl+C para encerrar")
+    print("-" * 50)
+    live = LiveTranscriber(transcriber, step_seconds=args.step)
+    try:
+        live.run(args.source)
+    except KeyboardInterrupt:
+        print()
+        live.print_stats()
+
+
+if __name__ == "__main__":
+    main()
@@ -33,12 +33,7 @@ def _advanced_mode_selection():
 
 def _default_mode_selection():
     """Configuração padrão com parâmetros fixos"""
-    return {
-        "model": Config.DEFAULT_MODEL,
-        "beam_size": Config.DEFAULT_BEAM_SIZE,
-        "best_of": Config.DEFAULT_BEST_OF,
-        "temperature": Config.DEFAULT_TEMPERATURE,
-    }
+    return Config.get_default_params()
 
 def _create_or_edit_profile():
     """Cria ou edita um perfil personalizado"""
@@ -108,13 +103,14 @@ def _create_new_profile():
         "temperature": temperature,
     }
     
-    Config.save_profile(profile_name, params, description)
+    # Perfil novo ou sobrescrito: nada do perfil anterior com o mesmo nome é mantido
+    Config.save_profile(profile_name, params, description, replace=True)
     
     print(f"\n✅ Perfil '{profile_name}' salvo com sucesso!")
     
     execute_now = input("🚀 Executar transcrição com este perfil agora? (s/n): ").strip().lower()
     if execute_now == 's':
-        return params
+        return Config.get_profile_params(profile_name)
     else:
         return choose_mode_and_params()
 
@@ -169,7 +165,7 @@ def _edit_existing_profile():
             
             execute_now = input("🚀 Executar transcrição com este perfil agora? (s/n): ").strip().lower()
             if execute_now == 's':
-                return params
+                return Config.get_profile_params(profile_name)
             else:
                 return choose_mode_and_params()
         else:
@@ -236,13 +232,7 @@ def _execute_with_profile():
             print(f"\n✅ Perfil selecionado: {profile_name}")
             print(f"📊 Configurações: {selected_profile['model']} | Beam: {selected_profile['beam_size']} | Best: {selected_profile['best_of']}")
             
-            return {
-                "model": selected_profile["model"],
-                "beam_size": selected_profile["beam_size"],
-                "best_of": selected_profile["best_of"],
-                "temperature": selected_profile["temperature"],
-                "profile_name": profile_name
-            }
+            return Config.get_profile_params(profile_name)
         else:
             print("❌ Escolha inválida.")
             return _execute_with_profile()
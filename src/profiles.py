@@ -0,0 +1,121 @@
+import copy
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class ProfileStore:
+    """Perfis em JSON com cache em memória validado por mtime/tamanho, gravação atômica
+    e trava consultiva (arquivo .lock) para vários processos lendo e gravando ao mesmo tempo.
+    """
+
+    def __init__(self, path, defaults):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(f"{self.path.name}.lock")
+        self.defaults = defaults
+        self._profiles = None
+        self._stamp = None
+        self._directory_ready = False
+
+    def load(self):
+        """Retorna uma cópia dos perfis; o arquivo só é relido quando muda no disco"""
+        if self._profiles is None or self._stat() != self._stamp:
+            with self._locked():
+                self._refresh()
+        return copy.deepcopy(self._profiles)
+
+    def update(self, change):
+        """Lê, altera e grava os perfis sob a trava; retorna o valor de change(perfis)"""
+        with self._locked():
+            self._refresh()
+            profiles = copy.deepcopy(self._profiles)
+            result = change(profiles)
+            if profiles != self._profiles:
+                self._write(profiles)
+        return result
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    @contextmanager
+    def _locked(self):
+        if not self._directory_ready:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._directory_ready = True
+
+        with open(self.lock_path, 'a+b') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _refresh(self):
+        """Atualiza o cache a partir do disco (com a trava obtida)"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stat = os.fstat(f.fileno())
+                stamp = stat.st_mtime_ns, stat.st_size, stat.st_ino
+                if stamp == self._stamp:
+                    return
+                profiles = json.load(f)
+        except FileNotFoundError:
+            self._write(copy.deepcopy(self.defaults))
+            return
+        except ValueError as e:
+            self._recover(e)
+            return
+
+        if not isinstance(profiles, dict):
+            self._recover(ValueError("o conteúdo não é um objeto JSON"))
+            return
+
+        self._profiles = profiles
+        self._stamp = stamp
+
+    def _recover(self, error):
+        """Arquivo inválido: guarda uma cópia e restaura a última versão lida (ou os padrões)"""
+        backup = self.path.with_name(f"{self.path.name}.corrupt-{time.time_ns()}")
+        shutil.copy2(self.path, backup)
+
+        if self._profiles is not None:
+            print(f"⚠️ {self.path.name} inválido ({error}). Restaurado a partir da última versão lida; "
+                  f"o arquivo inválido foi salvo em {backup.name}")
+            self._write(self._profiles)
+        else:
+            print(f"⚠️ {self.path.name} inválido ({error}). Perfis padrão recriados; "
+                  f"o conteúdo anterior foi salvo em {backup.name}")
+            self._write(copy.deepcopy(self.defaults))
+
+    def _write(self, profiles):
+        """Grava via temporário + rename: leitores nunca veem um arquivo pela metade"""
+        tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(profiles, f, indent=4, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+        self._profiles = profiles
+        self._stamp = self._stat()
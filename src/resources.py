@@ -0,0 +1,173 @@
+import os
+import subprocess
+import threading
+
+import torch
+
+from .config import Config
+
+MB = 1024 * 1024
+
+
+def current_rss_mb():
+    """Retorna a memória residente (RSS) atual do processo em MB"""
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / MB
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / MB
+    except ImportError:
+        return 0.0
+
+
+class PeakMemoryMonitor:
+    """Amostra o RSS em segundo plano e registra o pico durante um bloco"""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.baseline_mb = 0.0
+        self.peak_mb = 0.0
+        self.peak_vram_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.baseline_mb = current_rss_mb()
+        self.peak_mb = self.baseline_mb
+        self._stop.clear()
+
+        if torch.cuda.is_available():
+            torch.cuda.reset_peak_memory_stats()
+
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+        if torch.cuda.is_available():
+            self.peak_vram_mb = torch.cuda.max_memory_allocated() / MB
+        return False
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+
+# Milhões de parâmetros de cada modelo Whisper
+MODEL_PARAMETERS_M = {
+    "tiny": 39,
+    "base": 74,
+    "small": 244,
+    "medium": 769,
+    "large": 1550,
+    "large-v3": 1550,
+}
+
+# Pico aproximado de RAM por segundo de áudio no pipeline do Whisper: saída do ffmpeg (int16),
+# forma de onda float32 + padding, STFT complexa, magnitudes e log-mel
+AUDIO_MB_PER_SECOND = 0.5
+MIN_CHUNK_SECONDS = 60
+TYPICAL_FILE_SECONDS = 600
+RUNTIME_OVERHEAD_MB = 400
+
+
+class MemoryBudgetError(RuntimeError):
+    """O trabalho não cabe no limite de memória configurado"""
+
+
+def available_memory_mb():
+    """Memória disponível no sistema em MB (None se não for possível medir)"""
+    try:
+        with open("/proc/meminfo", 'r') as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+
+    try:
+        import psutil
+        return psutil.virtual_memory().available / MB
+    except ImportError:
+        return None
+
+
+def probe_duration(audio_file):
+    """Duração do áudio em segundos via ffprobe, sem decodificar o arquivo"""
+    try:
+        output = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", str(audio_file)],
+            capture_output=True, check=True, text=True,
+        ).stdout
+        return float(output.strip())
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        # Estimativa conservadora: áudio comprimido a ~16 kbps
+        return os.path.getsize(audio_file) / 2000
+
+
+class ResourceGovernor:
+    """Estima a memória de modelo e arquivos e decide como processar dentro do limite de RSS"""
+
+    def __init__(self, model, device, limit_mb=None):
+        self.model = model
+        self.device = device
+
+        if limit_mb is None:
+            available = available_memory_mb()
+            if available is not None:
+                limit_mb = current_rss_mb() + available * Config.MEMORY_AUTO_FRACTION
+        self.limit_mb = limit_mb
+
+    def estimate_model_mb(self):
+        """RAM necessária para carregar e executar o modelo"""
+        parameters = MODEL_PARAMETERS_M.get(self.model, MODEL_PARAMETERS_M["large"]) * 1e6
+        if self.device == "cuda":
+            # Os pesos vão para a GPU; na RAM fica o checkpoint durante o carregamento
+            return parameters * 2 / MB + RUNTIME_OVERHEAD_MB
+        # Pesos float32 + checkpoint carregado ao mesmo tempo durante o load
+        return parameters * 6 / MB + RUNTIME_OVERHEAD_MB
+
+    def estimate_file_mb(self, duration):
+        """RAM extra para decodificar e processar um arquivo inteiro"""
+        return duration * AUDIO_MB_PER_SECOND
+
+    def check_model(self):
+        """Recusa modelos que sozinhos já passam do limite"""
+        required = self.estimate_model_mb()
+        if self.limit_mb is not None and required > self.limit_mb:
+            raise MemoryBudgetError(
+                f"Modelo '{self.model}' precisa de ~{required:.0f}MB e o limite é {self.limit_mb:.0f}MB. "
+                f"Use um modelo menor ou aumente Config.MEMORY_LIMIT_MB."
+            )
+        return required
+
+    def plan_file(self, duration):
+        """Retorna ("full", None), ("chunked", segundos por bloco) ou ("refuse", None)"""
+        if self.limit_mb is None:
+            return "full", None
+
+        budget = self.limit_mb - current_rss_mb()
+        if self.estimate_file_mb(duration) <= budget:
+            return "full", None
+
+        chunk_seconds = int(budget / AUDIO_MB_PER_SECOND) // 30 * 30
+        if chunk_seconds < MIN_CHUNK_SECONDS:
+            return "refuse", None
+        return "chunked", chunk_seconds
+
+    def max_workers(self, requested):
+        """Quantos processos com o modelo carregado cabem no limite"""
+        if self.limit_mb is None:
+            return requested
+
+        per_worker = self.estimate_model_mb() + self.estimate_file_mb(TYPICAL_FILE_SECONDS)
+        return max(1, min(requested, int(self.limit_mb // per_worker)))
@@ -0,0 +1,191 @@
+import argparse
+import sqlite3
+from pathlib import Path
+
+from .config import Config
+from .words import WordSidecar
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    start_ms INTEGER NOT NULL,
+    end_ms INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    speaker INTEGER
+);
+CREATE INDEX IF NOT EXISTS segments_file ON segments(file_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+    text, content='segments', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS segments_ai AFTER INSERT ON segments BEGIN
+    INSERT INTO segments_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS segments_ad AFTER DELETE ON segments BEGIN
+    INSERT INTO segments_fts(segments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+
+def format_ms(milliseconds):
+    """Formata milissegundos como HH:MM:SS.mmm"""
+    seconds, ms = divmod(int(milliseconds), 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{ms:03d}"
+
+
+def _segments_from_sidecar(words_file):
+    """Reconstrói segmentos com tempos a partir de um .words"""
+    sidecar = WordSidecar(words_file)
+    segments = {}
+    for i in range(len(sidecar)):
+        segment = segments.setdefault(int(sidecar.segment[i]), {
+            "start": sidecar.start_ms[i] / 1000,
+            "end": sidecar.end_ms[i] / 1000,
+            "text": "",
+            "speaker": int(sidecar.speaker[i]) or None,
+        })
+        segment["end"] = sidecar.end_ms[i] / 1000
+        segment["text"] += sidecar.word(i)
+    return [segments[key] for key in sorted(segments)]
+
+
+class TranscriptIndex:
+    """Índice invertido (SQLite FTS5) das transcrições, atualizado arquivo a arquivo"""
+
+    def __init__(self, db_path=None):
+        self.db_path = Path(db_path or Config.SEARCH_INDEX_FILE)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.connection = sqlite3.connect(self.db_path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.connection.executescript(_SCHEMA)
+
+        columns = {row[1] for row in self.connection.execute("PRAGMA table_info(segments)")}
+        if "speaker" not in columns:
+            # Índices criados antes da diarização
+            self.connection.execute("ALTER TABLE segments ADD COLUMN speaker INTEGER")
+
+    def close(self):
+        self.connection.close()
+
+    def add_transcript(self, txt_file, segments):
+        """Indexa (ou reindexa) uma transcrição com seus segmentos"""
+        txt_file = Path(txt_file)
+        rows = [
+            (
+                round(segment["start"] * 1000),
+                round(segment["end"] * 1000),
+                segment["text"].strip(),
+                segment.get("speaker"),
+            )
+            for segment in segments
+            if segment["text"].strip()
+        ]
+
+        with self.connection:
+            self.connection.execute("DELETE FROM files WHERE name = ?", (txt_file.name,))
+            file_id = self.connection.execute(
+                "INSERT INTO files (name, mtime_ns) VALUES (?, ?)",
+                (txt_file.name, txt_file.stat().st_mtime_ns),
+            ).lastrowid
+            self.connection.executemany(
+                "INSERT INTO segments (file_id, start_ms, end_ms, text, speaker) VALUES (?, ?, ?, ?, ?)",
+                [(file_id, *row) for row in rows],
+            )
+
+        return len(rows)
+
+    def sync(self, output_dir=None):
+        """Indexa apenas os .txt novos ou alterados e remove os que não existem mais"""
+        output_dir = Path(output_dir or Config.OUTPUT_DIR)
+        indexed = dict(self.connection.execute("SELECT name, mtime_ns FROM files"))
+        updated = 0
+
+        for txt_file in sorted(output_dir.glob("*.txt")):
+            if indexed.pop(txt_file.name, None) == txt_file.stat().st_mtime_ns:
+                continue
+
+            words_file = txt_file.with_suffix(".words")
+            if words_file.exists():
+                segments = _segments_from_sidecar(words_file)
+            else:
+                segments = [{"start": 0, "end": 0, "text": txt_file.read_text(encoding='utf-8')}]
+
+            self.add_transcript(txt_file, segments)
+            updated += 1
+
+        with self.connection:
+            self.connection.executemany("DELETE FROM files WHERE name = ?", [(name,) for name in indexed])
+
+        return updated, len(indexed)
+
+    def search(self, query, limit=20, raw=False):
+        """Busca segmentos; retorna arquivo, início/fim em ms, locutor e trecho destacado"""
+        if not raw:
+            query = " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+        cursor = self.connection.execute(
+            """
+            SELECT files.name, segments.start_ms, segments.end_ms, segments.speaker,
+                   snippet(segments_fts, 0, '[', ']', '…', 16)
+            FROM segments_fts
+            JOIN segments ON segments.id = segments_fts.rowid
+            JOIN files ON files.id = segments.file_id
+            WHERE segments_fts MATCH ?
+            ORDER BY bm25(segments_fts)
+            LIMIT ?
+            """,
+            (query, limit),
+        )
+        return [
+            {"file": name, "start_ms": start_ms, "end_ms": end_ms, "speaker": speaker, "snippet": snippet}
+            for name, start_ms, end_ms, speaker, snippet in cursor
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Busca nas transcrições geradas")
+    parser.add_argument("query", nargs="?", help="Termos a buscar")
+    parser.add_argument("--limit", type=int, default=20, help="Número máximo de resultados")
+    parser.add_argument("--raw", action="store_true", help="Usar a sintaxe FTS5 diretamente (AND, OR, NEAR, prefixo*)")
+    parser.add_argument("--sync", action="store_true", help="Indexar .txt novos/alterados da pasta de saída antes de buscar")
+    args = parser.parse_args()
+
+    index = TranscriptIndex()
+    try:
+        if args.sync:
+            updated, removed = index.sync()
+            print(f"🗂️ Índice atualizado: {updated} arquivo(s) indexado(s), {removed} removido(s)")
+
+        if not args.query:
+            return
+
+        try:
+            results = index.search(args.query, limit=args.limit, raw=args.raw)
+        except sqlite3.OperationalError as e:
+            print(f"❌ Consulta inválida: {e}")
+            print("💡 Verifique a sintaxe FTS5 (AND, OR, NEAR, prefixo*) ou busque sem --raw.")
+            return
+        if not results:
+            print("❌ Nenhum resultado encontrado.")
+            return
+
+        for result in results:
+            speaker = f"  🗣️ Locutor {result['speaker']}" if result["speaker"] else ""
+            print(f"📄 {result['file']}  ⏱️ {format_ms(result['start_ms'])} → {format_ms(result['end_ms'])}"
+                  f"  ({result['start_ms']} ms){speaker}")
+            print(f"   {result['snippet']}")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+import argparse
+import gc
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+from whisper.audio import HOP_LENGTH, N_FRAMES, SAMPLE_RATE
+from whisper.normalizers import BasicTextNormalizer
+
+from .backends import BACKENDS
+from .config import Config
+from .decoding import DECODER_ENGINES
+from .resources import PeakMemoryMonitor, current_rss_mb
+from .transcriber import AudioTranscriber
+
+_normalizer = BasicTextNormalizer()
+
+# Opções que podem ser comparadas lado a lado; o primeiro valor é a referência
+COMPARISONS = {
+    "decoder": DECODER_ENGINES,
+    "repetition_guard": [False, True],
+    "backend": list(BACKENDS),
+}
+
+
+def _edit_distance(reference, hypothesis):
+    """Distância de Levenshtein entre duas sequências de tokens"""
+    if not reference:
+        return len(hypothesis)
+    if not hypothesis:
+        return len(reference)
+
+    vocabulary = {}
+    ref = np.array([vocabulary.setdefault(token, len(vocabulary)) for token in reference])
+    hyp = np.array([vocabulary.setdefault(token, len(vocabulary)) for token in hypothesis])
+
+    offsets = np.arange(len(hyp) + 1)
+    row = offsets.copy()
+    for i, token in enumerate(ref, 1):
+        candidates = np.empty_like(row)
+        candidates[0] = i
+        candidates[1:] = np.minimum(row[1:] + 1, row[:-1] + (hyp != token))
+        # Inserções: row[j] = min(candidates[j], row[j-1] + 1), resolvido sem laço
+        row = np.minimum.accumulate(candidates - offsets) + offsets
+
+    return int(row[-1])
+
+
+def error_counts(reference, hypothesis):
+    """Retorna (erros de palavra, palavras, erros de caractere, caracteres) após normalização"""
+    reference = _normalizer(reference)
+    hypothesis = _normalizer(hypothesis)
+
+    ref_words, hyp_words = reference.split(), hypothesis.split()
+    ref_chars, hyp_chars = " ".join(ref_words), " ".join(hyp_words)
+
+    return (
+        _edit_distance(ref_words, hyp_words),
+        len(ref_words),
+        _edit_distance(ref_chars, hyp_chars),
+        len(ref_chars),
+    )
+
+
+def pareto_front(rows):
+    """Perfis não dominados considerando WER e fator de tempo real (ambos menores é melhor)"""
+    def objectives(row):
+        return (row["wer"] if row["wer"] is not None else 0.0, row["rtf"])
+
+    front = []
+    for row in rows:
+        wer, rtf = objectives(row)
+        dominated = any(
+            other_wer <= wer and other_rtf <= rtf and (other_wer, other_rtf) != (wer, rtf)
+            for other_wer, other_rtf in map(objectives, rows)
+        )
+        if not dominated:
+            front.append(row)
+    return front
+
+
+def suggest_profile(front):
+    """Escolhe, na fronteira de Pareto, o perfil mais próximo do ideal (WER e RTF mínimos)"""
+    if not front:
+        return None
+
+    wers = [row["wer"] or 0.0 for row in front]
+    rtfs = [row["rtf"] for row in front]
+    wer_span = (max(wers) - min(wers)) or 1.0
+    rtf_span = (max(rtfs) - min(rtfs)) or 1.0
+
+    def distance(row):
+        wer = ((row["wer"] or 0.0) - min(wers)) / wer_span
+        rtf = (row["rtf"] - min(rtfs)) / rtf_span
+        return wer ** 2 + rtf ** 2
+
+    return min(front, key=distance)
+
+
+class ProfileSweep:
+    """Executa vários perfis sobre uma pasta de amostras e compara custo e precisão"""
+
+    def __init__(self, samples_dir, runs):
+        self.samples_dir = Path(samples_dir)
+        self.runs = runs
+        self.samples = self._find_samples()
+        self._features = {}
+
+    def _find_samples(self):
+        """Lista (áudio, texto de referência ou None) da pasta de amostras"""
+        samples = []
+        for format_ext in Config.SUPPORTED_AUDIO_FORMATS:
+            for audio_file in sorted(self.samples_dir.glob(f"*{format_ext}")):
+                reference_file = audio_file.with_suffix(".txt")
+                reference = None
+                if reference_file.exists():
+                    reference = reference_file.read_text(encoding='utf-8')
+                samples.append((audio_file, reference))
+        return samples
+
+    def _features_for(self, transcriber, audio_file):
+        """Log-mel compartilhado entre perfis (mesmo arquivo e mesmo n_mels)"""
+        key = (audio_file, transcriber.model.dims.n_mels)
+        if key not in self._features:
+            self._features[key] = transcriber.load_features(audio_file)
+        return self._features[key]
+
+    def run(self):
+        """Executa todas as variações (rótulo, parâmetros) e retorna as linhas do relatório"""
+        rows = []
+        for label, params in self.runs:
+            print(f"\n🎯 Perfil: {label}")
+            rows.append(self._run_profile(label, params))
+
+        return rows
+
+    def _run_profile(self, name, params):
+        """Transcreve todas as amostras com um perfil e mede WER/CER, RTF e memória.
+
+        A memória é o pico acima do RSS de antes do perfil, sem o log-mel compartilhado:
+        os perfis são comparáveis entre si, independentemente da ordem de execução.
+        """
+        word_errors = words = char_errors = chars = 0
+        total_time = total_duration = 0.0
+
+        transcriber = AudioTranscriber(params)
+        with PeakMemoryMonitor() as load_monitor:
+            transcriber.initialize()
+
+        # Log-mel carregado fora da medição, para não pesar só no primeiro perfil que o usa
+        before_features_mb = current_rss_mb()
+        features = [self._features_for(transcriber, audio_file) for audio_file, _ in self.samples]
+        shared_mb = max(0.0, current_rss_mb() - before_features_mb)
+
+        with PeakMemoryMonitor() as monitor:
+            for (audio_file, reference), mel in zip(self.samples, features):
+                start = time.time()
+                result = transcriber.transcribe(audio_file, mel=mel)
+                elapsed = time.time() - start
+
+                total_time += elapsed
+                total_duration += (mel.shape[-1] - N_FRAMES) * HOP_LENGTH / SAMPLE_RATE
+                print(f"   🎧 {audio_file.name}: {elapsed:.1f}s")
+
+                if reference is not None:
+                    counts = error_counts(reference, result["text"])
+                    word_errors += counts[0]
+                    words += counts[1]
+                    char_errors += counts[2]
+                    chars += counts[3]
+
+        peak_mb = max(load_monitor.peak_mb, monitor.peak_mb - shared_mb) - load_monitor.baseline_mb
+
+        del transcriber, features
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+        return {
+            "profile": name,
+            "base_profile": params.get("profile_name", name),
+            "model": params["model"],
+            "beam_size": params["beam_size"],
+            "best_of": params["best_of"],
+            "temperature": params["temperature"],
+            "backend": params.get("backend", Config.DEFAULT_BACKEND),
+            "decoder": params.get("decoder", Config.DEFAULT_DECODER),
+            "repetition_guard": params.get("repetition_guard", Config.REPETITION_GUARD),
+            "wer": word_errors / words if words else None,
+            "cer": char_errors / chars if chars else None,
+            "rtf": total_time / total_duration if total_duration else 0.0,
+            "audio_seconds": total_duration,
+            "transcribe_seconds": total_time,
+            "peak_rss_mb": max(0.0, peak_mb),
+            "peak_vram_mb": max(load_monitor.peak_vram_mb, monitor.peak_vram_mb),
+        }
+
+
+def build_runs(profile_names, compare=None):
+    """Monta a lista (rótulo, parâmetros); com compare, cada perfil roda em todas as variações da opção"""
+    runs = []
+    for name in profile_names:
+        params = Config.get_profile_params(name)
+        if params is None:
+            print(f"⚠️ Perfil '{name}' não encontrado, pulando...")
+            continue
+
+        if not compare:
+            runs.append((name, params))
+            continue
+
+        for value in COMPARISONS[compare]:
+            runs.append((f"{name} [{value}]", {**params, compare: value}))
+
+    return runs
+
+
+def comparison_speedups(rows, compare):
+    """Aceleração de cada variação em relação à primeira (referência) do mesmo perfil"""
+    baseline_value = COMPARISONS[compare][0]
+    baselines = {row["base_profile"]: row for row in rows if row[compare] == baseline_value}
+
+    speedups = {}
+    for row in rows:
+        baseline = baselines.get(row["base_profile"])
+        if baseline and row is not baseline and row["rtf"] > 0:
+            speedups[row["profile"]] = baseline["rtf"] / row["rtf"]
+    return speedups
+
+
+def print_report(rows, front, suggestion, speedups=None):
+    """Imprime a tabela comparativa dos perfis"""
+    def percent(value):
+        return f"{value * 100:6.2f}%" if value is not None else "     -"
+
+    front_names = {row["profile"] for row in front}
+    speedups = speedups or {}
+
+    print("\n")
+    print("📊 COMPARAÇÃO DE PERFIS")
+    print("=" * 78)
+    print(f"{'Perfil':<22} {'Modelo':<9} {'WER':>7} {'CER':>7} {'RTF':>7} {'Pico RSS':>10} {'Pareto':>7}")
+    print("-" * 78)
+    for row in rows:
+        pareto = "⭐" if row["profile"] in front_names else ""
+        print(
+            f"{row['profile']:<22} {row['model']:<9} {percent(row['wer']):>7} {percent(row['cer']):>7} "
+            f"{row['rtf']:7.3f} {row['peak_rss_mb']:8.0f}MB {pareto:>7}"
+        )
+    print("=" * 78)
+
+    for name, speedup in speedups.items():
+        print(f"🚀 {name}: {speedup:.2f}x em relação à referência")
+
+    if suggestion:
+        print(f"💡 Perfil sugerido: {suggestion['profile']} (WER {percent(suggestion['wer']).strip()}, RTF {suggestion['rtf']:.3f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara perfis de transcrição sobre uma pasta de amostras")
+    parser.add_argument("--samples", default=str(Config.SWEEP_SAMPLES_DIR),
+                        help="Pasta com áudios e transcrições de referência (.txt com o mesmo nome)")
+    parser.add_argument("--profiles", nargs="*", help="Perfis a comparar (padrão: todos)")
+    parser.add_argument("--compare", choices=sorted(COMPARISONS),
+                        help="Roda cada perfil com todas as variações desta opção (ex.: decoder: stock x fast)")
+    parser.add_argument("--json", default=str(Config.SWEEP_REPORT_FILE), help="Arquivo do relatório JSON")
+    args = parser.parse_args()
+
+    profile_names = args.profiles or list(Config.load_profiles().keys())
+    runs = build_runs(profile_names, args.compare)
+    sweep = ProfileSweep(args.samples, runs)
+
+    if not sweep.samples:
+        print(f"❌ Nenhum arquivo de áudio encontrado em '{args.samples}'.")
+        return
+
+    print(f"🎵 {len(sweep.samples)} amostra(s), {len(runs)} execução(ões)")
+    rows = sweep.run()
+    front = pareto_front(rows)
+    suggestion = suggest_profile(front)
+
+    speedups = comparison_speedups(rows, args.compare) if args.compare else {}
+
+    print_report(rows, front, suggestion, speedups)
+
+    report = {
+        "samples": [str(audio_file) for audio_file, _ in sweep.samples],
+        "profiles": rows,
+        "pareto": [row["profile"] for row in front],
+        "suggested": suggestion["profile"] if suggestion else None,
+        "speedups": speedups,
+    }
+    with open(args.json, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+    print(f"📁 Relatório salvo em: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,57 @@
-import whisper
+import os
 import time
 import torch
 import threading
 import queue
+import sqlite3
 from pathlib import Path
+from subprocess import CalledProcessError, run
+import numpy as np
+from whisper.audio import HOP_LENGTH, N_FRAMES, N_SAMPLES, SAMPLE_RATE, log_mel_spectrogram
+from .backends import create_backend
+from .cache import AudioCache, FeatureCache, precomputed_features
 from .config import Config
+from .decoding import DecodingStats, install_decoding_engine
+from .diarization import SpeakerDiarizer, assign_speakers, format_speaker_transcript
+from .resources import MemoryBudgetError, PeakMemoryMonitor, ResourceGovernor, probe_duration
+from .search import TranscriptIndex
+from .words import install_encoder_cache, write_word_sidecar
+
+def _load_audio_range(audio_file, start, duration):
+    """Decodifica apenas um trecho do arquivo (mono, 16 kHz) via ffmpeg"""
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0",
+        "-ss", str(start), "-t", str(duration),
+        "-i", str(audio_file),
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE),
+        "-",
+    ]
+    try:
+        out = run(cmd, capture_output=True, check=True).stdout
+    except CalledProcessError as e:
+        raise RuntimeError(f"Falha ao carregar trecho do áudio: {e.stderr.decode()}") from e
+
+    return np.frombuffer(out, np.int16).astype(np.float32) / 32768.0
+
 
 class AudioTranscriber:
     def __init__(self, params):
         self.params = params
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.backend = create_backend(params.get("backend", Config.DEFAULT_BACKEND))
+        self.device = self.backend.select_device()
         self.model = None
         self.interrupted = False
+        self.audio_cache = AudioCache() if Config.AUDIO_CACHE_ENABLED else None
+        self.feature_cache = FeatureCache(audio_cache=self.audio_cache) if Config.FEATURE_CACHE_ENABLED else None
+        self.search_index = None
+        self.decoding_stats = DecodingStats()
+        self.governor = ResourceGovernor(
+            params["model"], self.device, params.get("memory_limit_mb", Config.MEMORY_LIMIT_MB)
+        )
         
     def initialize(self):
         """Inicializa o modelo e configura a GPU"""
-        print(f"🖥️ Dispositivo: {self.device.upper()}")
+        print(f"🖥️ Dispositivo: {self.device.upper()} (backend: {self.backend.name})")
         
         if self.device == "cuda":
             print(f"🎮 GPU: {torch.cuda.get_device_name(0)}")
@@ -23,10 +59,22 @@ class AudioTranscriber:
             torch.backends.cuda.matmul.allow_tf32 = True
             torch.backends.cudnn.allow_tf32 = True
 
+        required_mb = self.governor.check_model()
+        if self.governor.limit_mb is not None:
+            print(f"🧠 Memória estimada do modelo: ~{required_mb:.0f}MB (limite: {self.governor.limit_mb:.0f}MB)")
+
         print(f"🤖 Carregando modelo Whisper '{self.params['model']}'...")
         start_time = time.time()
 
         self._load_model()
+        install_encoder_cache(self.model)
+        install_decoding_engine(
+            self.model,
+            self.params.get("decoder", Config.DEFAULT_DECODER),
+            self.decoding_stats,
+            repetition_guard=self.params.get("repetition_guard", Config.REPETITION_GUARD),
+            backend=self.backend,
+        )
 
         if self.device == "cuda":
             print("🔥 GPU preparada para uso")
@@ -78,18 +126,27 @@ class AudioTranscriber:
     def _load_model_thread(self, result_queue):
         """Carrega o modelo em thread separada"""
         try:
-            model = whisper.load_model(self.params["model"], device=self.device)
+            model = self.backend.load_model(self.params["model"], self.device)
             result_queue.put(("success", model))
         except Exception as e:
             result_queue.put(("error", e))
 
-    def transcribe_files(self):
-        """Transcreve todos os arquivos de áudio encontrados"""
+    def transcribe_files(self, lease_manager=None):
+        """Transcreve todos os arquivos de áudio encontrados
+
+        Com um lease_manager, só processa os arquivos que conseguir reservar,
+        permitindo dividir a pasta de entrada entre vários nós/processos. Os arquivos
+        reservados por outros nós são verificados de novo a cada LEASE_HEARTBEAT_SECONDS,
+        até ficarem prontos ou o lease expirar (nó travado) e poderem ser retomados.
+        """
         if not self.model:
             raise RuntimeError("Modelo não foi inicializado. Chame initialize() primeiro.")
             
         Config.ensure_directories()
         
+        if Config.SEARCH_INDEX_ENABLED and self.search_index is None:
+            self.search_index = TranscriptIndex()
+        
         audio_files = self._get_audio_files()
         if not audio_files:
             print("❌ Nenhum arquivo de áudio encontrado na pasta 'data/input'.")
@@ -100,32 +157,88 @@ class AudioTranscriber:
         print("💡 Pressione Ctrl+C para cancelar a qualquer momento")
         print("-" * 50)
 
+        # Em modo distribuído cada nó converte só o que reservar, sob demanda
+        if self.audio_cache and not lease_manager:
+            self._preconvert_audio(audio_files)
+
         total_transcribe_time = 0
         total_audio_duration = 0
         processed_files = 0
+        finished_elsewhere = 0
+        pending = list(enumerate(audio_files, 1))
+        rescanning = False
         
         try:
-            for i, audio_file in enumerate(audio_files, 1):
-                if self.interrupted:
-                    break
-                    
-                txt_file = Config.OUTPUT_DIR / f"{audio_file.stem}.txt"
+            while pending and not self.interrupted:
+                claimed_elsewhere = []
 
-                if txt_file.exists():
-                    print(f"[{i}/{len(audio_files)}] ⚠️ {audio_file.name} -> Já transcrito, pulando...")
-                    continue
+                for i, audio_file in pending:
+                    if self.interrupted:
+                        break
+                        
+                    txt_file = Config.OUTPUT_DIR / f"{audio_file.stem}.txt"
+
+                    if txt_file.exists():
+                        if lease_manager:
+                            # Pasta de saída compartilhada: pronto é pronto, seja qual for o nó
+                            finished_elsewhere += 1
+                        print(f"[{i}/{len(audio_files)}] ⚠️ {audio_file.name} -> Já transcrito, pulando...")
+                        continue
 
-                result = self._transcribe_single_file(audio_file, i, len(audio_files))
-                if result:
-                    total_transcribe_time += result["transcribe_time"]
-                    total_audio_duration += result["audio_duration"]
-                    processed_files += 1
+                    if lease_manager:
+                        if not lease_manager.claim(audio_file):
+                            if not rescanning:
+                                print(f"[{i}/{len(audio_files)}] 🌐 {audio_file.name} -> Em processamento em outro nó, pulando...")
+                            claimed_elsewhere.append((i, audio_file))
+                            continue
+                        if txt_file.exists():
+                            lease_manager.release(audio_file)
+                            finished_elsewhere += 1
+                            continue
+
+                    try:
+                        result = self._transcribe_single_file(audio_file, i, len(audio_files))
+                    finally:
+                        if lease_manager:
+                            lease_manager.release(audio_file)
+
+                    if result:
+                        total_transcribe_time += result["transcribe_time"]
+                        total_audio_duration += result["audio_duration"]
+                        processed_files += 1
+
+                pending = claimed_elsewhere
+                if pending and not self.interrupted:
+                    print(f"⏳ {len(pending)} arquivo(s) em processamento em outros nós; "
+                          f"verificando novamente em {Config.LEASE_HEARTBEAT_SECONDS}s...")
+                    time.sleep(Config.LEASE_HEARTBEAT_SECONDS)
+                    rescanning = True
 
         except KeyboardInterrupt:
             self.interrupted = True
             raise
 
-        self._print_summary(total_transcribe_time, total_audio_duration, processed_files, len(audio_files))
+        self._print_summary(total_transcribe_time, total_audio_duration, processed_files, len(audio_files), finished_elsewhere)
+
+    def _preconvert_audio(self, audio_files):
+        """Normaliza de uma vez (em paralelo) os arquivos que ainda vão ser transcritos"""
+        pending = [
+            audio_file for audio_file in audio_files
+            if not (Config.OUTPUT_DIR / f"{audio_file.stem}.txt").exists() and not self._has_cached_features(audio_file)
+        ]
+        if not pending:
+            return
+
+        start = time.time()
+        try:
+            converted = self.audio_cache.prefetch(pending)
+        except OSError as e:
+            # Sem pré-conversão: cada arquivo é convertido sob demanda, com erro isolado por arquivo
+            print(f"⚠️ Pré-conversão do áudio interrompida: {e}")
+            return
+        if converted:
+            print(f"🎼 {converted} arquivo(s) convertido(s) para 16 kHz mono em {time.time() - start:.1f}s")
+            print("-" * 50)
 
     def _get_audio_files(self):
         """Retorna lista de arquivos de áudio suportados"""
@@ -140,41 +253,204 @@ class AudioTranscriber:
 
         try:
             transcribe_start = time.time()
-            
-            transcribe_options = {
-                "language": "pt",
-                "verbose": False,
-                "condition_on_previous_text": False,
-                "temperature": self.params["temperature"],
-                "compression_ratio_threshold": 2.4,
-                "logprob_threshold": -1.0,
-                "no_speech_threshold": 0.6,
-                "beam_size": self.params["beam_size"],
-                "best_of": self.params["best_of"],
-            }
-
-            if self.device == "cuda":
-                transcribe_options["fp16"] = True
-
-            result = self.model.transcribe(str(audio_file), **transcribe_options)
+            with PeakMemoryMonitor() as memory:
+                result = self.transcribe(audio_file)
             transcribe_time = time.time() - transcribe_start
 
             if self.device == "cuda":
                 torch.cuda.empty_cache()
 
             txt_file = Config.OUTPUT_DIR / f"{audio_file.stem}.txt"
-            with open(txt_file, 'w', encoding='utf-8') as f:
-                f.write(result["text"].strip())
+            if "speakers" in result:
+                self._write_atomic(txt_file, format_speaker_transcript(result["segments"]))
+                print(f"   🗣️ Locutores identificados: {result['speakers']}")
+            else:
+                self._write_atomic(txt_file, result["text"].strip())
+
+            if self._word_timestamps_enabled():
+                words_file = Config.OUTPUT_DIR / f"{audio_file.stem}.words"
+                word_count = write_word_sidecar(words_file, result["segments"])
+                print(f"   🔤 Tempos de {word_count} palavras em: {words_file.name}")
 
-            return self._print_file_result(txt_file, result, transcribe_time)
+            self._index_transcript(txt_file, result)
+
+            return self._print_file_result(txt_file, result, transcribe_time, memory.peak_mb)
 
         except KeyboardInterrupt:
             raise
+        except MemoryBudgetError as e:
+            print(f"   🧠 {audio_file.name} recusado: {e}")
+            return None
+        except MemoryError:
+            print(f"   🧠 Memória insuficiente ao transcrever {audio_file.name}")
+            if self.device == "cuda":
+                torch.cuda.empty_cache()
+            return None
         except Exception as e:
             print(f"   ❌ Erro ao transcrever {audio_file.name}: {e}")
             return None
 
-    def _print_file_result(self, txt_file, result, transcribe_time):
+    def _index_transcript(self, txt_file, result):
+        """Atualiza o índice de busca com os segmentos do arquivo recém-transcrito"""
+        if not self.search_index:
+            return
+
+        try:
+            self.search_index.add_transcript(txt_file, result["segments"])
+        except sqlite3.Error as e:
+            print(f"   ⚠️ Não foi possível indexar {txt_file.name}: {e}")
+
+    def _write_atomic(self, target_file, text):
+        """Grava o arquivo via temporário + rename, para outros nós nunca verem um .txt parcial"""
+        tmp_file = target_file.with_name(f".{target_file.name}.{os.getpid()}.tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_file, target_file)
+
+    def transcribe(self, audio_file, mel=None):
+        """Transcreve um arquivo e retorna o resultado do Whisper, sem salvar nada"""
+        if not self.model:
+            raise RuntimeError("Modelo não foi inicializado. Chame initialize() primeiro.")
+
+        transcribe_options = self._build_transcribe_options()
+        diarizer = self._create_diarizer()
+
+        if mel is None and not self._has_cached_features(audio_file):
+            duration = probe_duration(audio_file)
+            strategy, chunk_seconds = self.governor.plan_file(duration)
+            if strategy == "refuse":
+                raise MemoryBudgetError(
+                    f"~{self.governor.estimate_file_mb(duration):.0f}MB necessários para {duration / 60:.0f} min de áudio, "
+                    f"limite de {self.governor.limit_mb:.0f}MB"
+                )
+            if strategy == "chunked":
+                print(f"   🧩 Arquivo longo para o limite de memória: processando em blocos de {chunk_seconds}s")
+                return self._transcribe_chunked(audio_file, transcribe_options, chunk_seconds, diarizer)
+
+        if diarizer is None:
+            return self._run_model(audio_file, transcribe_options, mel)
+
+        # A diarização usa o mesmo log-mel da transcrição: o áudio é decodificado uma única vez
+        if mel is None:
+            mel = self.load_features(audio_file)
+        result = self._run_model(audio_file, transcribe_options, mel)
+        diarizer.add_features(mel, n_frames=mel.shape[-1] - N_FRAMES)
+        return self._attach_speakers(result, diarizer)
+
+    def _has_cached_features(self, audio_file):
+        return bool(self.feature_cache) and self.feature_cache.path_for(audio_file, self.model.dims.n_mels).exists()
+
+    def _create_diarizer(self):
+        if not self.params.get("diarization", Config.DIARIZATION_ENABLED):
+            return None
+        return SpeakerDiarizer(num_speakers=self.params.get("speakers", Config.DIARIZATION_SPEAKERS))
+
+    def _attach_speakers(self, result, diarizer):
+        """Marca os segmentos com os locutores encontrados pelo diarizer (sem fala detectada, nada muda)"""
+        turns = diarizer.turns()
+        if not turns:
+            return result
+        assign_speakers(result["segments"], turns)
+        result["speakers"] = len({speaker for _, _, speaker in turns})
+        return result
+
+    def _transcribe_chunked(self, audio_file, transcribe_options, chunk_seconds, diarizer=None):
+        """Transcreve o arquivo em blocos decodificados separadamente, limitando o pico de memória"""
+        texts = []
+        segments = []
+        offset = 0
+        cached_audio = self.audio_cache.load(audio_file) if self.audio_cache else None
+
+        while True:
+            if cached_audio is not None:
+                # Fatia do memmap: só as páginas do bloco são lidas do disco
+                audio = cached_audio[offset * SAMPLE_RATE:(offset + chunk_seconds) * SAMPLE_RATE]
+            else:
+                audio = _load_audio_range(audio_file, offset, chunk_seconds)
+            if not len(audio):
+                break
+
+            if diarizer is None:
+                result = self.model.transcribe(audio, **transcribe_options)
+            else:
+                mel = log_mel_spectrogram(audio, self.model.dims.n_mels, padding=N_SAMPLES)
+                diarizer.add_features(mel, offset=offset, n_frames=mel.shape[-1] - N_FRAMES)
+                with precomputed_features(mel):
+                    result = self.model.transcribe(audio, **transcribe_options)
+
+            for segment in result["segments"]:
+                segment["id"] = len(segments)
+                segment["seek"] += offset * SAMPLE_RATE // HOP_LENGTH
+                segment["start"] += offset
+                segment["end"] += offset
+                for word in segment.get("words", []):
+                    word["start"] += offset
+                    word["end"] += offset
+                segments.append(segment)
+            texts.append(result["text"].strip())
+
+            if len(audio) < chunk_seconds * SAMPLE_RATE:
+                break
+            offset += chunk_seconds
+
+        result = {
+            "text": " ".join(text for text in texts if text),
+            "segments": segments,
+            "language": transcribe_options["language"],
+        }
+        if diarizer is not None:
+            self._attach_speakers(result, diarizer)
+        return result
+
+    def _build_transcribe_options(self):
+        """Monta as opções do model.transcribe a partir dos parâmetros"""
+        transcribe_options = {
+            "language": "pt",
+            "verbose": False,
+            "condition_on_previous_text": False,
+            "temperature": self.params["temperature"],
+            "compression_ratio_threshold": 2.4,
+            "logprob_threshold": -1.0,
+            "no_speech_threshold": 0.6,
+            "beam_size": self.params["beam_size"],
+            "best_of": self.params["best_of"],
+        }
+
+        if self.device == "cuda":
+            transcribe_options["fp16"] = True
+
+        if self._word_timestamps_enabled():
+            transcribe_options["word_timestamps"] = True
+
+        return transcribe_options
+
+    def _word_timestamps_enabled(self):
+        return self.params.get("word_timestamps", Config.WORD_TIMESTAMPS)
+
+    def load_features(self, audio_file):
+        """Retorna o log-mel do arquivo para o modelo carregado"""
+        n_mels = self.model.dims.n_mels
+        if self.feature_cache:
+            return self.feature_cache.load(audio_file, n_mels)
+        return log_mel_spectrogram(self._load_audio(audio_file), n_mels, padding=N_SAMPLES)
+
+    def _load_audio(self, audio_file):
+        """Amostras do cache de áudio, ou o caminho para o Whisper decodificar via ffmpeg"""
+        if self.audio_cache:
+            return self.audio_cache.load(audio_file)
+        return str(audio_file)
+
+    def _run_model(self, audio_file, transcribe_options, mel=None):
+        """Executa o Whisper, reaproveitando o log-mel em cache quando disponível"""
+        if mel is None:
+            if not self.feature_cache:
+                return self.model.transcribe(self._load_audio(audio_file), **transcribe_options)
+            mel = self.load_features(audio_file)
+
+        with precomputed_features(mel):
+            return self.model.transcribe(str(audio_file), **transcribe_options)
+
+    def _print_file_result(self, txt_file, result, transcribe_time, peak_rss_mb=None):
         """Imprime resultado da transcrição de um arquivo"""
         word_count = len(result["text"].split())
         
@@ -190,6 +466,8 @@ class AudioTranscriber:
         print(f"   ✅ Salvo: {txt_file.name}")
         print(f"   ⏱️ Tempo: {transcribe_time:.1f}s {speed_text}")
         print(f"   📝 Palavras: {word_count}")
+        if peak_rss_mb:
+            print(f"   🧠 Pico de RSS: {peak_rss_mb:.0f}MB")
         print(f"   👀 Prévia: {result['text'][:80]}...")
         print()
 
@@ -198,17 +476,20 @@ class AudioTranscriber:
             "audio_duration": audio_duration
         }
 
-    def _print_summary(self, total_transcribe_time, total_audio_duration, processed_files, total_files):
+    def _print_summary(self, total_transcribe_time, total_audio_duration, processed_files, total_files, finished_elsewhere=0):
         """Imprime resumo final da transcrição"""
         print("\n")
         
-        if processed_files == total_files:
+        completed_files = processed_files + finished_elsewhere
+        if completed_files == total_files:
             print("🎉 TRANSCRIÇÃO CONCLUÍDA COM SUCESSO!")
         else:
             print("⚠️ TRANSCRIÇÃO PARCIALMENTE CONCLUÍDA")
         
         print("\n")
         print(f"📊 Arquivos processados: {processed_files}/{total_files}")
+        if finished_elsewhere:
+            print(f"🌐 {finished_elsewhere} arquivo(s) concluído(s) por outros nós")
         
         if total_transcribe_time > 0 and total_audio_duration > 0:
             overall_speed = total_audio_duration / total_transcribe_time
@@ -216,6 +497,22 @@ class AudioTranscriber:
         
         print(f"📁 Arquivos salvos em: {Config.OUTPUT_DIR}")
         
-        if processed_files < total_files:
-            remaining = total_files - processed_files
+        if self.decoding_stats.early_exits:
+            print(f"✂️ Beam search encerrado antecipadamente em {self.decoding_stats.early_exits}/{self.decoding_stats.windows} janela(s)")
+        
+        if self.decoding_stats.loops:
+            print(
+                f"🔁 Laços de repetição interrompidos em {self.decoding_stats.loops} janela(s), "
+                f"{self.decoding_stats.retries} retranscrita(s) "
+                f"(~{self.decoding_stats.steps_saved} passos / ~{self.decoding_stats.seconds_saved:.1f}s de decodificação economizados)"
+            )
+        
+        if self.feature_cache and (self.feature_cache.hits or self.feature_cache.misses):
+            print(f"🗃️ Cache de features: {self.feature_cache.hits} acerto(s), {self.feature_cache.misses} cálculo(s)")
+        
+        if self.audio_cache and (self.audio_cache.hits or self.audio_cache.conversions):
+            print(f"🎼 Cache de áudio: {self.audio_cache.hits} leitura(s), {self.audio_cache.conversions} conversão(ões) pelo ffmpeg")
+        
+        if completed_files < total_files:
+            remaining = total_files - completed_files
             print(f"🔄 {remaining} arquivo(s) restante(s) - execute novamente para continuar")
\ No newline at end of file